@@ -0,0 +1,85 @@
+import tarfile
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import ux
+
+# Writes a build's output straight into a tar or zip archive, without
+#  creating the target tree on disk. Outputs are what check.expected_outputs
+#  works out: converted text, or a file to copy, by path in the archive.
+
+Output_type = dict[str, str | Path]
+
+# tarfile write modes by archive suffix
+tar_modes: dict[str, str] = {
+    '.tar': 'w',
+    '.tar.gz': 'w:gz',
+    '.tgz': 'w:gz',
+    '.tar.bz2': 'w:bz2',
+    '.tar.xz': 'w:xz',
+}
+
+# Not worth deflating again in a zip
+compressed_suffixes = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif',
+                       '.zip', '.gz', '.pdf', '.mp4', '.webm', '.woff2'}
+
+
+def archive_format(archive_file: Path) -> str | None:
+    # 'zip', a tarfile mode, or None if the suffix isn't supported
+    name = archive_file.name.lower()
+
+    if name.endswith('.zip'):
+        return 'zip'
+
+    for suffix, mode in tar_modes.items():
+        if name.endswith(suffix):
+            return mode
+
+    return None
+
+
+def write_archive(archive_file: Path, outputs: Output_type) -> None:
+    archive_mode = archive_format(archive_file)
+    if archive_mode is None:
+        raise ValueError(f'{archive_file}: not a .zip or .tar(.gz/.bz2/.xz) file')
+
+    archive_file.parent.mkdir(parents=True, exist_ok=True)
+    ux.print(f'Writing {len(outputs)} files to {archive_file}')
+
+    if archive_mode == 'zip':
+        write_zip(archive_file, outputs)
+    else:
+        write_tar(archive_file, archive_mode, outputs)
+
+
+def write_tar(archive_file: Path, mode: str, outputs: Output_type) -> None:
+    now = time.time()
+
+    with tarfile.open(archive_file, mode) as archive:  # type: ignore
+        for path, content in outputs.items():
+            if isinstance(content, Path):
+                archive.add(content, arcname=path, recursive=False)
+                continue
+
+            data = content.encode('utf-8')
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            info.mtime = int(now)
+            info.mode = 0o644
+            archive.addfile(info, BytesIO(data))
+
+
+def write_zip(archive_file: Path, outputs: Output_type) -> None:
+    with zipfile.ZipFile(archive_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for path, content in outputs.items():
+            if isinstance(content, Path):
+                compress_type = zipfile.ZIP_STORED \
+                    if content.suffix.lower() in compressed_suffixes else zipfile.ZIP_DEFLATED
+                archive.write(content, arcname=path, compress_type=compress_type)
+            else:
+                info = zipfile.ZipInfo(path, time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                archive.writestr(info, content)
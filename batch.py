@@ -0,0 +1,128 @@
+import shlex
+from pathlib import Path
+
+import fileman
+import filemod
+import imageopt
+import manifest
+import summary_nav_yml
+import ux
+
+# Converts several books in one process, e.g. the versions of a versioned
+#  GitBook space. The plugins are loaded once, and a page that's the same in
+#  several books (same path and source, links going to the same pages) is
+#  only converted for the first one; the others get the cached conversion,
+#  with their own asset names.
+#
+# The batch file lists a source and a target directory per line:
+#
+#  src/v1 docs/v1
+#  src/v2 docs/v2
+#  "src/version 3" "docs/version 3"
+
+Book_pair_type = tuple[Path, Path]
+
+
+def read_pairs(batch_file: Path) -> list[Book_pair_type]:
+    # Raises OSError if the file can't be read, ValueError with the file and
+    #  line number if a line is malformed
+    pairs: list[Book_pair_type] = []
+
+    try:
+        text = batch_file.read_text(encoding='utf-8')
+    except UnicodeDecodeError:
+        raise ValueError(f'{batch_file}: not a UTF-8 text file')
+
+    for line_number, line in enumerate(text.splitlines(), 1):
+        try:
+            fields = shlex.split(line, comments=True)
+        except ValueError as e:
+            raise ValueError(f'{batch_file}:{line_number}: {str(e).lower()}')
+
+        if not fields:
+            continue
+
+        if len(fields) != 2:
+            raise ValueError(f'{batch_file}:{line_number}: expected a source and a target directory')
+
+        pairs.append((Path(fields[0]), Path(fields[1])))
+
+    return pairs
+
+
+def convert_book(docs_source_dir: Path, docs_target_dir: Path, extra_source_dir: Path,
+                 asset_source_dir: Path, asset_target_dir: Path,
+                 generate_nav: bool = True, jobs: int = 1, dedupe_assets: bool = False,
+                 asset_names: str = 'counter',
+                 image_optimizer: imageopt.ImageOptimizer | None = None) -> None:
+    # The same steps as a full build by gitbook2mkdocs.py
+    full_asset_sourcedir = docs_source_dir / asset_source_dir
+    full_asset_targetdir = docs_target_dir / asset_target_dir
+
+    asset_index = fileman.AssetIndex(full_asset_sourcedir)
+    filemod.set_asset_namer(fileman.make_asset_namer(asset_index, asset_names, dedupe_assets))
+    if image_optimizer is not None:
+        filemod.set_asset_namer(image_optimizer.namer(filemod.asset_namer, asset_index))
+
+    manifest.remove(docs_target_dir)
+
+    assets_dict = filemod.convert_files(
+        docs_source_dir, docs_target_dir, asset_source_dir, asset_target_dir,
+        jobs=jobs)
+
+    nav_files: list[str] = []
+    if generate_nav:
+        nav_files = summary_nav_yml.generate_nav_ymls(docs_target_dir,
+                                                      include_star=True,
+                                                      always_use_titles=False)
+
+    fileman.write_assets_json(docs_source_dir, assets_dict)
+    fileman.copy_assets(assets_dict, full_asset_sourcedir, full_asset_targetdir,
+                        asset_index)
+
+    fileman.copy_extra_files(docs_target_dir, extra_source_dir)
+
+    fileman.remove_stale_outputs(docs_target_dir, fileman.build_outputs(
+        filemod.page_outputs, nav_files, assets_dict, asset_target_dir, extra_source_dir))
+
+
+def run(pairs: list[Book_pair_type], extra_source_dir: Path,
+        asset_source_dir: Path, asset_target_dir: Path,
+        generate_nav: bool = True, jobs: int = 1, dedupe_assets: bool = False,
+        asset_names: str = 'counter',
+        image_optimizer: imageopt.ImageOptimizer | None = None) -> None:
+    filemod.enable_conversion_cache()
+
+    for docs_source_dir, docs_target_dir in pairs:
+        ux.header(f'Converting {docs_source_dir} to {docs_target_dir}...')
+
+        if not docs_source_dir.exists():
+            ux.print(f" Source directory {docs_source_dir} doesn't exist, skipping")
+            continue
+
+        converted = filemod.conversion_count
+
+        convert_book(docs_source_dir, docs_target_dir, extra_source_dir,
+                     asset_source_dir, asset_target_dir,
+                     generate_nav, jobs, dedupe_assets, asset_names, image_optimizer)
+
+        pages = sum(1 for page in filemod.page_index
+                    if Path(page).name != summary_nav_yml.summary_filename.name)
+        converted = filemod.conversion_count - converted
+        ux.print(f'\n... {pages} pages, {converted} converted, '
+                 f'{pages - converted} taken from earlier books')
+
+        if filemod.broken_links:
+            ux.print(f'\n{len(filemod.broken_links)} links go to pages that don\'t exist:')
+            for page, link in filemod.broken_links:
+                ux.print(f' {page}: {link}')
+
+        if filemod.over_budget_pages:
+            ux.print(f'\n{len(filemod.over_budget_pages)} pages went over the time budget and were passed through unchanged:')
+            for target_file in filemod.over_budget_pages:
+                ux.print(f' {target_file}')
+
+        filemod.broken_links.clear()
+        filemod.over_budget_pages.clear()
+
+    filemod.enable_conversion_cache(False)
@@ -0,0 +1,5 @@
+# Benchmarks for gitbook2mkdocs. Run from the repository root:
+#
+#   python -m bench --pages 2000
+#   python -m bench --pages 2000 --save-baseline main
+#   python -m bench --pages 2000 --compare main
@@ -0,0 +1,161 @@
+import json
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import filemod
+import fileman
+import re_apply
+import summary_nav_yml
+import ux
+
+from bench import corpus
+
+# Times each stage of a conversion of a generated book, and each plugin on
+#  its own. Results can be stored as a named baseline and compared against
+#  later, e.g. before and after a change.
+
+baseline_dir = Path(__file__).parent / 'baselines'
+
+asset_source_dir = Path('.gitbook/assets')
+asset_target_dir = Path('assets')
+
+Results_type = dict[str, float]
+
+
+def timed(results: Results_type, key: str, function, *args, **kwargs):
+    started = time.perf_counter()
+    value = function(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+
+    # Keep the best of all repeats, it's the least noisy
+    results[key] = min(results.get(key, elapsed), elapsed)
+    return value
+
+
+def run_stages(results: Results_type, source_dir: Path, work_dir: Path, jobs: int) -> None:
+    target_dir = work_dir / 'docs'
+
+    assets_dict = timed(results, 'stage/convert_files', filemod.convert_files,
+                        source_dir, target_dir, asset_source_dir, asset_target_dir, jobs=jobs)
+
+    timed(results, 'stage/generate_nav_ymls', summary_nav_yml.generate_nav_ymls,
+          target_dir, include_star=True, always_use_titles=False)
+
+    timed(results, 'stage/copy_assets', fileman.copy_assets,
+          dict(assets_dict), source_dir / asset_source_dir,
+          target_dir / asset_target_dir)
+
+    shutil.rmtree(target_dir)
+
+
+def run_plugins(results: Results_type, source_dir: Path) -> None:
+    pages = [md_file.read_text(encoding='utf-8')
+             for md_file in source_dir.glob('**/*.md')
+             if md_file.name != 'SUMMARY.md']
+
+    for plugin_name, plugin in re_apply.active_plugins().items():
+        assets: dict[str, str] = {}
+        plugin.local_dict['assets'] = assets
+
+        started = time.perf_counter()
+        for text in pages:
+            plugin.apply(text)
+        elapsed = time.perf_counter() - started
+
+        key = f'plugin/{plugin_name}'
+        results[key] = min(results.get(key, elapsed), elapsed)
+
+
+def print_results(results: Results_type, baseline: Results_type | None, threshold: float) -> list[str]:
+    # Returns the keys that got slower than the threshold allows
+    regressions: list[str] = []
+
+    print(f'\n{"benchmark":<28}{"time (ms)":>12}', end='')
+    print(f'{"baseline":>12}{"change":>10}' if baseline else '')
+
+    for key, seconds in results.items():
+        line = f'{key:<28}{seconds * 1000:>12.1f}'
+
+        if baseline and key in baseline and baseline[key] > 0:
+            change = seconds / baseline[key] - 1
+            line += f'{baseline[key] * 1000:>12.1f}{change:>+10.1%}'
+            if change > threshold:
+                line += '  REGRESSION'
+                regressions.append(key)
+
+        print(line)
+
+    return regressions
+
+
+def main() -> int:
+    parser = ArgumentParser(prog='python -m bench')
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--blocks', type=int, default=20,
+                        help='Content blocks per page')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--jobs', '-j', type=int, default=1)
+    parser.add_argument('--engine', '-e', choices=re_apply.engines,
+                        default=re_apply.engine)
+    parser.add_argument('--save-baseline', metavar='NAME',
+                        help='Store the results as a baseline')
+    parser.add_argument('--compare', metavar='NAME',
+                        help='Compare the results with a stored baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Slowdown reported as a regression (0.1 = 10%%)')
+    args = parser.parse_args()
+
+    ux.set_visible(False)
+    re_apply.set_engine(args.engine)
+
+    corpus_settings = {'pages': args.pages, 'blocks': args.blocks,
+                       'seed': args.seed}
+
+    baseline: Results_type | None = None
+    if args.compare:
+        baseline_file = baseline_dir / f'{args.compare}.json'
+        stored = json.loads(baseline_file.read_text(encoding='utf-8'))
+        if stored['corpus'] != corpus_settings:
+            print(f'Baseline {args.compare} was made with {stored["corpus"]}, '
+                  f'not {corpus_settings}')
+            return 2
+        baseline = stored['results']
+
+    results: Results_type = {}
+
+    with tempfile.TemporaryDirectory() as work:
+        work_dir = Path(work)
+        source_dir = work_dir / 'src'
+
+        print(f'Generating {args.pages} pages in {source_dir} ...')
+        corpus.generate(source_dir, pages=args.pages, seed=args.seed,
+                        blocks_per_page=args.blocks)
+
+        for repeat in range(args.repeat):
+            print(f'Run {repeat + 1} of {args.repeat} ...')
+            run_stages(results, source_dir, work_dir, args.jobs)
+            run_plugins(results, source_dir)
+
+    regressions = print_results(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        baseline_dir.mkdir(parents=True, exist_ok=True)
+        baseline_file = baseline_dir / f'{args.save_baseline}.json'
+        baseline_file.write_text(json.dumps(
+            {'corpus': corpus_settings, 'results': results}, indent=4),
+            encoding='utf-8')
+        print(f'\nSaved baseline {baseline_file}')
+
+    if regressions:
+        print(f'\n{len(regressions)} regressions')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
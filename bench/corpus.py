@@ -0,0 +1,159 @@
+import random
+from pathlib import Path
+
+# Generates a synthetic GitBook export: a SUMMARY.md with nested chapters,
+#  and pages using the constructs the plugins deal with (hints, tabs, code
+#  blocks with {% code %} wrappers, figures, file embeds, hidden pages...).
+#  The same seed always gives the same tree.
+
+words = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do '
+         'eiusmod tempor incididunt ut labore et dolore magna aliqua').split()
+
+hint_styles = ['info', 'warning', 'danger', 'success']
+languages = ['python', 'csharp', 'bash', 'json', '']
+
+
+def sentence(rng: random.Random, length: int = 12) -> str:
+    return ' '.join(rng.choice(words) for _ in range(length)).capitalize() + '.'
+
+
+def paragraph(rng: random.Random) -> str:
+    return ' '.join(sentence(rng, rng.randint(6, 16)) for _ in range(rng.randint(2, 6))) + '\n'
+
+
+def code_block(rng: random.Random) -> str:
+    language = rng.choice(languages)
+    lines = '\n'.join(f'{rng.choice(words)} = {rng.randint(0, 99)}  # * {rng.choice(words)}'
+                      for _ in range(rng.randint(2, 12)))
+    block = f'```{language}\n{lines}\n```\n'
+
+    if rng.random() < 0.5:
+        title = f'{rng.choice(words)}.{language or "txt"}'
+        return f'{{% code title="{title}" lineNumbers="true" %}}\n{block}{{% endcode %}}\n'
+    return block
+
+
+def hint(rng: random.Random) -> str:
+    body = sentence(rng)
+    if rng.random() < 0.3:
+        body += '\n\n' + code_block(rng).rstrip('\n')
+    return f'{{% hint style="{rng.choice(hint_styles)}" %}}\n{body}\n{{% endhint %}}\n'
+
+
+def tabs(rng: random.Random) -> str:
+    tab_list = ''.join(f'{{% tab title="{rng.choice(words)}" %}}\n{paragraph(rng)}{{% endtab %}}\n'
+                       for _ in range(rng.randint(2, 4)))
+    return f'{{% tabs %}}\n{tab_list}{{% endtabs %}}\n'
+
+
+def figure(rng: random.Random, root: str, assets: list[str]) -> str:
+    asset = rng.choice(assets)
+    if rng.random() < 0.5:
+        return f'<figure><img src="{root}.gitbook/assets/{asset}" alt=""><figcaption><p>{sentence(rng, 4)}</p></figcaption></figure>\n'
+    return f'![{rng.choice(words)}](<{root}.gitbook/assets/{asset}>)\n'
+
+
+def file_embed(rng: random.Random, root: str) -> str:
+    return f'{{% file src="{root}.gitbook/assets/{rng.choice(words)}.pdf" %}}\n{sentence(rng, 3)}\n{{% endfile %}}\n'
+
+
+def list_block(rng: random.Random) -> str:
+    items = ''
+    for _ in range(rng.randint(2, 6)):
+        items += f'* {sentence(rng, 5)}\n'
+        if rng.random() < 0.4:
+            items += f'  * {sentence(rng, 4)}\n'
+    return items
+
+
+def links(rng: random.Random, root: str, chapter_dirs: list[str]) -> str:
+    return f'See [{rng.choice(words)}]({root}{rng.choice(chapter_dirs)}/) and ' \
+        f'<mark style="color:red;">`{rng.choice(words)}`</mark> for more\\\n{sentence(rng)}\n'
+
+
+def page(rng: random.Random, page_name: str, title: str, hidden: bool,
+         assets: list[str], chapter_dirs: list[str], blocks: int) -> str:
+    # Relative path from the page back to the root of the book
+    root = '../' * page_name.count('/')
+
+    parts: list[str] = []
+    if hidden:
+        parts.append('---\nhidden: true\n---\n')
+    else:
+        parts.append(f'---\ndescription: {sentence(rng, 6)}\n---\n')
+    parts.append(f'\n# {title}\n\n')
+
+    makers = [
+        lambda: paragraph(rng),
+        lambda: paragraph(rng),
+        lambda: hint(rng),
+        lambda: tabs(rng),
+        lambda: code_block(rng),
+        lambda: figure(rng, root, assets),
+        lambda: file_embed(rng, root),
+        lambda: list_block(rng),
+        lambda: links(rng, root, chapter_dirs),
+        lambda: f'> {sentence(rng)}\n>     {sentence(rng, 4)}\n',
+    ]
+    for _ in range(blocks):
+        parts.append(rng.choice(makers)() + '\n')
+
+    return ''.join(parts)
+
+
+def generate(source_dir: Path, pages: int = 500, seed: int = 1,
+             blocks_per_page: int = 20, hidden_ratio: float = 0.05) -> None:
+    rng = random.Random(seed)
+
+    asset_dir = source_dir / '.gitbook' / 'assets'
+    asset_dir.mkdir(parents=True, exist_ok=True)
+
+    # Images, some of them byte-identical under different names
+    assets: list[str] = []
+    for index in range(max(4, pages // 4)):
+        name = f'image ({index}).png' if index % 3 else f'screenshot-{index}.png'
+        content = bytes(rng.getrandbits(8) for _ in range(256)) \
+            if index % 5 else b'duplicate image'
+        (asset_dir / name).write_bytes(content)
+        assets.append(name.replace(' ', '%20') if index % 2 else name)
+    for word in words:
+        (asset_dir / f'{word}.pdf').write_bytes(b'%PDF-1.4')
+
+    chapters = max(1, pages // 40)
+    chapter_dirs = [f'chapter-{index}' for index in range(chapters)]
+    summary = ['# Table of contents\n', '\n', '* [Introduction](README.md)\n']
+
+    (source_dir / 'README.md').write_text(
+        page(rng, 'README.md', 'Introduction', False, assets, chapter_dirs,
+             blocks_per_page),
+        encoding='utf-8')
+
+    for chapter_index, chapter_dir in enumerate(chapter_dirs):
+        summary.append(f'\n## Chapter {chapter_index}\n\n')
+        summary.append(f'* [Chapter {chapter_index}]({chapter_dir}/README.md)\n')
+        (source_dir / chapter_dir).mkdir(parents=True, exist_ok=True)
+        (source_dir / chapter_dir / 'README.md').write_text(
+            page(rng, f'{chapter_dir}/README.md', f'Chapter {chapter_index}',
+                 False, assets, chapter_dirs, blocks_per_page),
+            encoding='utf-8')
+
+        section_pages = (pages - 1) // chapters - 1
+        for page_index in range(section_pages):
+            # Every fifth page starts a nested section
+            if page_index % 5 == 0:
+                section_dir = f'{chapter_dir}/section-{page_index}'
+                (source_dir / section_dir).mkdir(parents=True, exist_ok=True)
+                page_name = f'{section_dir}/README.md'
+                indent = '  '
+            else:
+                page_name = f'{section_dir}/page-{page_index}.md'
+                indent = '    '
+
+            title = sentence(rng, 3)[:-1]
+            summary.append(f'{indent}* [{title}]({page_name})\n')
+            (source_dir / page_name).write_text(
+                page(rng, page_name, title, rng.random() < hidden_ratio,
+                     assets, chapter_dirs, blocks_per_page),
+                encoding='utf-8')
+
+    (source_dir / 'SUMMARY.md').write_text(''.join(summary), encoding='utf-8')
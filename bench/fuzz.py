@@ -0,0 +1,137 @@
+import random
+import re
+import sys
+import time
+from argparse import ArgumentParser
+
+import filemod
+import re_apply
+
+# Looks for inputs on which a plugin pattern takes super-linear time.
+#  Candidate inputs are a short unit of GitBook syntax, often left unclosed,
+#  repeated until the text has a given size. Each candidate is timed at that
+#  size and at twice the size: a linear pattern takes about twice as long
+#  (ratio 2), one that backtracks over the whole text takes 4 times as long
+#  or more.
+#
+#  python -m bench.fuzz [--plugins hint,code] [--trials 300] [--size 4000]
+
+# Pieces candidates are made of: the markup the plugins look for, both
+#  halves of it, and the characters their patterns stop at
+fragments: list[str] = [
+    '{% hint style="info" %}', '{% endhint %}',
+    '{% tabs %}', '{% tab title="T" %}', '{% endtab %}', '{% endtabs %}',
+    '{% code title="c.py" %}', '{% code %}', '{% endcode %}', '```', '```py',
+    '{% embed url="https://www.youtube.com/watch?v=x" %}',
+    '{% embed url="https://e.com" %}', '{% endembed %}',
+    '{% file src=".gitbook/assets/a.pdf" %}', '{% endfile %}',
+    '![', '![a](', '](', '](.gitbook/assets/a.png)', '[a](b/)',
+    '<img src="', '<figure>', '</figure>', '<figcaption>', '">', '" alt="',
+    '<mark style="color:red;">', '</mark>', '<mark', '\\<',
+    '>  ', '> ', '  - ', '    * ', '  1. ', '\\\n',
+    '\n', '\n\n', ' ', '  ', 'x', '"', '%', '}', ')', '[', ']', '<', '>', '/',
+]
+
+# Below this, timings are too noisy to compare
+min_seconds = 0.002
+
+# Slower than this and a candidate is reported as super-linear
+max_ratio = 3.0
+
+
+def make_text(unit: str, size: int) -> str:
+    return unit * max(1, size // len(unit))
+
+
+def time_pattern(pattern: re.Pattern[str], text: str, limit: float) -> float | None:
+    # Seconds for pattern.sub over text, None if that takes over limit
+    try:
+        with filemod.time_limit(limit):
+            started = time.perf_counter()
+            pattern.sub(lambda match: match[0], text)
+            return time.perf_counter() - started
+    except filemod.PageTimeout:
+        return None
+
+
+def candidates(rng: random.Random, trials: int) -> list[str]:
+    units = list(fragments)
+    units += [fragment + '\n' for fragment in fragments]
+
+    while len(units) < trials:
+        units.append(''.join(rng.choice(fragments)
+                             for _ in range(rng.randint(2, 5))))
+
+    return units[:trials]
+
+
+def fuzz_pattern(pattern: re.Pattern[str], units: list[str], size: int, limit: float) \
+        -> tuple[float, float, str]:
+    # Returns the worst (ratio, seconds at double size, unit). A ratio of
+    #  inf means the double size run went over the limit
+    worst: tuple[float, float, str] = (0.0, 0.0, '')
+
+    for unit in units:
+        small = time_pattern(pattern, make_text(unit, size), limit)
+        if small is None:
+            return (float('inf'), limit, unit)
+
+        large = time_pattern(pattern, make_text(unit, size * 2), limit)
+        if large is None:
+            return (float('inf'), limit, unit)
+
+        if large < min_seconds:
+            continue
+
+        # Best of two, against the noise
+        small = min(small, time_pattern(pattern, make_text(unit, size), limit) or small)
+        ratio = large / max(small, 1e-9)
+
+        if ratio > worst[0]:
+            worst = (ratio, large, unit)
+
+    return worst
+
+
+def main() -> int:
+    parser = ArgumentParser(prog='python -m bench.fuzz')
+    parser.add_argument('--plugins', type=str, default='',
+                        help='Comma separated plugins to fuzz, all by default')
+    parser.add_argument('--trials', type=int, default=300,
+                        help='Number of candidate inputs per pattern')
+    parser.add_argument('--size', type=int, default=4000,
+                        help='Size of the smaller text, in characters')
+    parser.add_argument('--limit', type=float, default=2.0,
+                        help='Seconds after which a single run is stopped')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    selected = [name for name in args.plugins.split(',') if name]
+    units = candidates(random.Random(args.seed), args.trials)
+
+    print(f'{"pattern":<14}{"ratio":>8}{"ms":>10}  worst input')
+
+    found = 0
+
+    for plugin_name, plugin in re_apply.active_plugins().items():
+        if selected and plugin_name not in selected:
+            continue
+
+        for index, pattern in enumerate(plugin.pattern):
+            ratio, seconds, unit = fuzz_pattern(
+                pattern, units, args.size, args.limit)
+
+            line = f'{f"{plugin_name}[{index}]":<14}{ratio:>8.1f}{seconds * 1000:>10.1f}  {unit!r}'
+            if ratio > max_ratio:
+                line += '  SUPER-LINEAR'
+                found += 1
+            print(line)
+
+    if found:
+        print(f'\n{found} patterns take super-linear time')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import fileman
+import manifest
+import ux
+from converter import Converter
+
+# Works out what a build would leave in the target dir, without writing or
+#  deleting anything, and compares that with what's there by hash. Used by
+#  --check, e.g. in CI to see whether a committed docs/ tree is up to date.
+
+# What a file in the target dir should hold: converted text, or the file it
+#  should be a copy of. By path relative to the target dir
+Expected_type = dict[str, str | Path]
+
+# (status, path), status being 'changed', 'missing' or 'extra'
+Difference_type = tuple[str, str]
+
+
+def expected_outputs(docs_source_dir: Path, extra_source_dir: Path,
+                     asset_source_dir: Path, asset_target_dir: Path,
+                     asset_index: fileman.AssetIndex,
+                     known_assets: fileman.Asset_dict_type | None = None,
+                     generate_nav: bool = True) -> Expected_type:
+    expected: Expected_type = {}
+
+    # Pages in the order a build converts them, which decides asset names
+    pages = {md_file.as_posix(): (docs_source_dir / md_file).read_text(encoding='utf-8')
+             for md_file in fileman.list_pages(docs_source_dir)}
+
+    converter = Converter(asset_source_dir, asset_target_dir, known_assets,
+                          include_star=True, always_use_titles=False)
+    conversion = converter.convert(pages)
+
+    expected.update(conversion.pages)
+
+    if generate_nav:
+        if not conversion.nav_files:
+            ux.print("... SUMMARY.md not found")
+        expected.update(conversion.nav_files)
+
+    copy_targets: dict[Path, Path] = {}
+    for original_name, new_name in conversion.assets.items():
+        source_file = asset_index.resolve(original_name)
+        if source_file is not None:
+            copy_targets.setdefault(asset_target_dir / new_name, source_file)
+
+    if fileman.asset_processor is not None:
+        copy_targets = fileman.asset_processor(copy_targets)
+
+    for target_file, source_file in copy_targets.items():
+        expected[target_file.as_posix()] = source_file
+
+    if extra_source_dir.exists():
+        for extra_file, source_file in fileman.extra_files(extra_source_dir).items():
+            expected[extra_file.as_posix()] = source_file
+
+    return expected
+
+
+def expected_hash(content: str | Path) -> str:
+    if isinstance(content, Path):
+        return manifest.file_hash(content.read_bytes())
+    return manifest.file_hash(content.encode('utf-8'))
+
+
+def compare(docs_target_dir: Path, expected: Expected_type) -> list[Difference_type]:
+    differences: list[Difference_type] = []
+
+    existing: set[str] = set()
+    if docs_target_dir.is_dir():
+        existing = {path.relative_to(docs_target_dir).as_posix()
+                    for path in docs_target_dir.rglob('*') if path.is_file()}
+
+    # The manifest of incremental builds isn't part of the output
+    existing.discard(manifest.manifest_filename.as_posix())
+
+    for path, content in expected.items():
+        if path not in existing:
+            differences.append(('missing', path))
+        elif manifest.file_hash((docs_target_dir / path).read_bytes()) != expected_hash(content):
+            differences.append(('changed', path))
+
+    for path in sorted(existing - expected.keys()):
+        differences.append(('extra', path))
+
+    return differences
+
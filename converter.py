@@ -0,0 +1,122 @@
+from pathlib import Path
+
+from fileman import Asset_dict_type, Page_index_type, is_hidden, page_output, \
+    read_frontmatter_text
+import filemod
+import re_apply
+import summary_nav_yml
+
+# Converts GitBook pages held in memory, without reading or writing files:
+#
+#  converter = Converter()
+#  result = converter.convert({'README.md': '...', 'SUMMARY.md': '...'})
+#  result.pages   {'README.md': '...'}        converted pages by output path
+#  result.assets  {'image (1).png': 'image-1.png'}
+#  result.nav     {'.nav.yml': {'ignore': ..., 'nav': [...]}}
+#
+# The plugins are loaded once and reused by every call. Plugins keep their
+#  state in the re_apply module, so conversions shouldn't run in parallel
+#  threads.
+
+
+class Conversion:
+    def __init__(self):
+        # Converted pages by output path, hidden pages end in .hidden.md
+        self.pages: dict[str, str] = {}
+        self.hidden: list[str] = []
+
+        # Asset names as used in the pages, and what they were renamed to
+        self.assets: Asset_dict_type = {}
+
+        # .nav.yml paths and their contents, if a SUMMARY.md was converted.
+        #  nav_files has them as text, the way they're written to disk
+        self.nav: dict[str, dict[str, object]] = {}
+        self.nav_files: dict[str, str] = {}
+
+        # Pages that went over the time budget and were passed through
+        self.over_budget: list[str] = []
+
+        # Links to pages that weren't given, as (page, link)
+        self.broken_links: list[tuple[str, str]] = []
+
+
+class Converter:
+    def __init__(self,
+                 asset_source_dir: Path = Path('.gitbook/assets'),
+                 asset_target_dir: Path = Path('assets'),
+                 known_assets: Asset_dict_type | None = None,
+                 include_star: bool = True,
+                 always_use_titles: bool = False):
+        # known_assets are asset names handed out before, e.g. by an earlier
+        #  run; they're kept and new assets are numbered after them. Asset
+        #  names carry over from one convert() call to the next
+        self.asset_source_dir = asset_source_dir
+        self.asset_target_dir = asset_target_dir
+        self.include_star = include_star
+        self.always_use_titles = always_use_titles
+        self.assets: Asset_dict_type = dict(known_assets) if known_assets else {}
+
+        re_apply.active_plugins()
+
+    def convert(self, pages: dict[str, str]) -> Conversion:
+        # pages maps paths relative to the book's root to their markdown,
+        #  SUMMARY.md included. Pages are converted in the mapping's order,
+        #  which decides the asset numbering
+        conversion = Conversion()
+
+        over_budget = len(filemod.over_budget_pages)
+        broken = len(filemod.broken_links)
+
+        self.use_pages(pages)
+
+        for page, text in pages.items():
+            output, hidden, text = self.convert_page(page, text)
+
+            conversion.pages[output] = text
+            if hidden:
+                conversion.hidden.append(output)
+
+        conversion.over_budget = [page.as_posix() for page
+                                  in filemod.over_budget_pages[over_budget:]]
+        del filemod.over_budget_pages[over_budget:]
+
+        conversion.broken_links = filemod.broken_links[broken:]
+        del filemod.broken_links[broken:]
+
+        conversion.assets = dict(self.assets)
+
+        summary_text = pages.get(summary_nav_yml.summary_filename.as_posix())
+        if summary_text is not None:
+            summary_nav_yml.set_flags(self.include_star, self.always_use_titles)
+
+            for nav_file, content in summary_nav_yml.parse_summary(summary_text).items():
+                conversion.nav[nav_file] = summary_nav_yml.nav_structure(content)
+                conversion.nav_files[nav_file] = summary_nav_yml.nav_yml_text(content)
+
+        return conversion
+
+    def use_pages(self, pages: dict[str, str]) -> Page_index_type:
+        # Links in converted pages are resolved against these pages, until
+        #  the next call. Returns the page index that's used for that
+        page_index: Page_index_type = {
+            page: page_output(Path(page), is_hidden(read_frontmatter_text(text)))
+            for page, text in pages.items()}
+
+        filemod.page_index.clear()
+        filemod.page_index.update(page_index)
+
+        return page_index
+
+    def convert_page(self, page: str, text: str) -> tuple[str, bool, str]:
+        # Returns the page's output path, whether it's hidden and its
+        #  converted text
+        re_apply.set_local('images', 'assets', self.assets)
+        re_apply.set_local('images', 'namer', filemod.asset_namer)
+        re_apply.set_local('file', 'assets', self.assets)
+        filemod.use_page_index()
+
+        target_file, hidden, text = filemod.convert_text(
+            text, Path(page), self.asset_source_dir, self.asset_target_dir,
+            Path(page))
+
+        return (target_file.as_posix(), hidden, text)
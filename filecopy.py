@@ -0,0 +1,143 @@
+import errno
+import os
+import shutil
+from pathlib import Path
+
+import ux
+
+# Shared copy engine for assets and extra files. Copies run in a
+#  bounded thread pool, since the time goes to waiting on the disk rather
+#  than to Python, and files whose target already has the same size and
+#  mtime are skipped.
+#
+# Modes:
+#  copy      regular copy, using copy_file_range where available
+#  reflink   copy-on-write clone (btrfs, xfs, ...), falls back to copy
+#  hardlink  link the target to the source, falls back to copy
+
+Copy_pair_type = tuple[Path, Path]
+
+copy_modes: list[str] = ['copy', 'reflink', 'hardlink']
+copy_mode: str = 'copy'
+copy_threads: int = 8
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# Errors meaning "this way of copying isn't possible here", as opposed to
+#  the source or target being unusable
+fallback_errors = (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+                   errno.ENOSYS, errno.EPERM, errno.EBADF, errno.EMLINK)
+
+
+def set_mode(mode: str, threads: int | None = None) -> None:
+    global copy_mode
+    global copy_threads
+
+    if mode not in copy_modes:
+        raise Exception(f"Unknown copy mode '{mode}'")
+    copy_mode = mode
+
+    if threads is not None:
+        copy_threads = max(1, threads)
+
+
+def is_unchanged(source_file: Path, target_file: Path) -> bool:
+    try:
+        source_stat = source_file.stat()
+        target_stat = target_file.stat()
+    except FileNotFoundError:
+        return False
+
+    return source_stat.st_size == target_stat.st_size \
+        and source_stat.st_mtime_ns == target_stat.st_mtime_ns
+
+
+def clone_file(source_file: Path, target_file: Path) -> bool:
+    # Copy-on-write clone, False if that isn't possible here. fcntl only
+    #  exists on Unix, so it's imported when a clone is attempted
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    with source_file.open('rb') as source, target_file.open('wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in fallback_errors:
+                raise
+    return False
+
+
+def copy_data(source_file: Path, target_file: Path) -> None:
+    if copy_mode == 'reflink' and clone_file(source_file, target_file):
+        return
+
+    # Without copy_file_range (e.g. Windows), shutil uses the platform's
+    #  fastest way of copying
+    if not hasattr(os, 'copy_file_range'):
+        shutil.copyfile(source_file, target_file)
+        return
+
+    with source_file.open('rb') as source, target_file.open('wb') as target:
+        try:
+            size = os.fstat(source.fileno()).st_size
+            copied = 0
+            while copied < size:
+                sent = os.copy_file_range(
+                    source.fileno(), target.fileno(), size - copied)
+                if sent == 0:
+                    break
+                copied += sent
+            if copied == size:
+                return
+        except OSError as e:
+            if e.errno not in fallback_errors:
+                raise
+        source.seek(0)
+        target.seek(0)
+        target.truncate()
+
+        shutil.copyfileobj(source, target, 1024 * 1024)
+
+
+def copy_file(source_file: Path, target_file: Path) -> bool:
+    # Returns False if the target was already up to date
+    if is_unchanged(source_file, target_file):
+        return False
+
+    target_file.parent.mkdir(parents=True, exist_ok=True)
+
+    if copy_mode == 'hardlink':
+        try:
+            target_file.unlink(missing_ok=True)
+            os.link(source_file, target_file)
+            return True
+        except OSError as e:
+            if e.errno not in fallback_errors:
+                raise
+
+    copy_data(source_file, target_file)
+
+    # Keep the source's mtime, so the next run can tell nothing changed
+    shutil.copystat(source_file, target_file)
+    return True
+
+
+def copy_many(pairs: list[Copy_pair_type]) -> int:
+    # Copies all (source, target) pairs, returns how many were copied
+    if len(pairs) == 0:
+        return 0
+
+    if copy_threads == 1 or len(pairs) == 1:
+        copied = sum(copy_file(source, target) for source, target in pairs)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=copy_threads) as executor:
+            copied = sum(executor.map(lambda pair: copy_file(*pair), pairs))
+
+    ux.print(f' ... {copied} copied, {len(pairs) - copied} already up to date')
+    return copied
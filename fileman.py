@@ -1,71 +1,220 @@
+import functools
+import hashlib
 import json
-import re
-import shutil
-import yaml
+import os
+import typing
+import unicodedata
 import urllib.parse
 from pathlib import Path
 
+import filecopy
+import manifest
 import ux
+from re_apply.plugins.images import name_asset
 
 Asset_dict_type = dict[str, str]
 
+# Output path of every page by its source path, both relative and posix
+Page_index_type = dict[str, str]
+
+# Turns the asset copies to make, as {target: source}, into the copies to
+#  make instead, e.g. from re-encoded images. See set_asset_processor
+Asset_processor_type = typing.Callable[[dict[Path, Path]], dict[Path, Path]]
+asset_processor: Asset_processor_type | None = None
+
+# Parsed frontmatter per file, with the (mtime, size) it was read at
+frontmatter_cache: dict[Path, tuple[tuple[int, int], dict[str, object]]] = {}
+
 
 def read_frontmatter(mdfile: Path) -> dict[str, object]:
-    pattern = re.compile(r'^---\n(?P<frontmatter>[\S\s]*?)\n---')
+    # Only reads the header of the file, and only parses it again if the
+    #  file changed since last time
+    stat = mdfile.stat()
+    file_key = (stat.st_mtime_ns, stat.st_size)
 
-    match = pattern.match(mdfile.read_text())
-    if match and match.group('frontmatter'):
-        yml: dict[str, object] = yaml.safe_load(match.group('frontmatter'))
-        return yml
-    return {}
+    cached = frontmatter_cache.get(mdfile)
+    if cached and cached[0] == file_key:
+        return dict(cached[1])
 
+    with mdfile.open(encoding='utf-8') as file:
+        frontmatter = parse_frontmatter(read_frontmatter_header(file))
 
-def copy_files(docs_source_dir: Path, docs_target_dir: Path, full_asset_target_dir: Path):
+    frontmatter_cache[mdfile] = (file_key, frontmatter)
+    return dict(frontmatter)
 
-    # Delete target dir
-    if docs_target_dir.exists():
-        shutil.rmtree(docs_target_dir)
-        ux.print(f'... deleted: {docs_target_dir}')
 
-    if not docs_target_dir.exists():
-        ux.print('== Copying files and folders ==')
+def read_frontmatter_text(text: str) -> dict[str, object]:
+    return parse_frontmatter(read_frontmatter_header(iter_lines(text)))
 
-        for md_file in docs_source_dir.glob('**/*.md'):
 
-            md_file = md_file.relative_to(docs_source_dir)
+def read_frontmatter_header(lines: typing.Iterable[str]) -> str:
+    # Collects the lines between the leading '---' and the closing '---',
+    #  and stops reading there. Returns '' if there's no frontmatter
+    line_iter = iter(lines)
 
-            # Make relative
-            source_file = docs_source_dir / md_file
-            target_file = docs_target_dir / md_file
+    if next(line_iter, None) != '---\n':
+        return ''
 
-            # Ignore files in folders starting with .
-            if (str(md_file).startswith('.')):
-                continue
+    header_lines: list[str] = []
+    for line in line_iter:
+        if line.startswith('---') and header_lines:
+            return ''.join(header_lines)[:-1]
+        header_lines.append(line)
 
-            # Create directory if it doesn't exist
-            target_file.parent.mkdir(parents=True, exist_ok=True)
+    return ''
 
-            frontmatter = read_frontmatter(source_file)
 
-            if 'hidden' in frontmatter and frontmatter['hidden'] == True:
-                target_file = Path(
-                    target_file.parent / (target_file.stem + ".hidden" + target_file.suffix))
+def iter_lines(text: str) -> typing.Iterator[str]:
+    # Like text.splitlines(keepends=True), but lazy
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end + 1]
+        start = end + 1
 
-            shutil.copy(
-                source_file,
-                target_file
-            )
-            ux.print(f' {source_file} >> {target_file}')
 
-        ux.print('... done copying md-pages tree')
-    else:
-        ux.print(f'... please delete {full_asset_target_dir}')
-        ux.print('Aborting!')
+@functools.cache
+def yaml_loader() -> type:
+    # yaml is only imported once a page has frontmatter. Use the libyaml
+    #  C loader when available, it's a lot faster
+    import yaml
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=1024)
+def load_frontmatter(header: str) -> dict[str, object]:
+    import yaml
+    yml = yaml.load(header, Loader=yaml_loader())
+    return yml if isinstance(yml, dict) else {}
+
+
+def parse_frontmatter(header: str) -> dict[str, object]:
+    if not header:
+        return {}
+
+    # Copy, so callers can't change what's in the cache
+    return dict(load_frontmatter(header))
+
+
+def is_hidden(frontmatter: dict[str, object]) -> bool:
+    return 'hidden' in frontmatter and frontmatter['hidden'] == True
+
+
+def hidden_name(target_file: Path) -> Path:
+    return Path(target_file.parent / (target_file.stem + ".hidden" + target_file.suffix))
+
+
+def page_output(md_file: Path, hidden: bool) -> str:
+    return (hidden_name(md_file) if hidden else md_file).as_posix()
+
+
+def build_page_index(docs_source_dir: Path, md_files: list[Path]) -> Page_index_type:
+    # Only reads the frontmatter of every page
+    return {md_file.as_posix(): page_output(
+                md_file, is_hidden(read_frontmatter(docs_source_dir / md_file)))
+            for md_file in md_files}
+
+
+def list_pages(docs_source_dir: Path) -> list[Path]:
+    # All md-pages, relative to the source dir
+    md_files: list[Path] = []
+
+    for md_file in docs_source_dir.glob('**/*.md'):
+        md_file = md_file.relative_to(docs_source_dir)
+
+        # Ignore files in folders starting with .
+        if (str(md_file).startswith('.')):
+            continue
+
+        md_files.append(md_file)
+
+    return md_files
+
+
+def build_outputs(page_outputs: Page_index_type, nav_files: list[str],
+                  assets_dict: Asset_dict_type, asset_target_dir: Path,
+                  extra_source_dir: Path) -> set[Path]:
+    # Everything a build puts in the target dir, relative to it. page_outputs
+    #  are the pages' outputs by source page, see filemod.page_outputs
+    outputs = {Path(output) for output in page_outputs.values()}
+    outputs.update(Path(nav_file) for nav_file in nav_files)
+    outputs.update(asset_target_dir / new_name for new_name in assets_dict.values())
+
+    if extra_source_dir.exists():
+        outputs.update(extra_files(extra_source_dir).keys())
+
+    return outputs
+
+
+def remove_stale_outputs(docs_target_dir: Path, outputs: set[Path]) -> int:
+    # Deletes the files in the target dir that aren't outputs, and
+    #  directories left empty. Everything else stays, so assets that are in
+    #  place already aren't copied again. An incremental build's manifest is
+    #  written after this. Returns how many files were deleted
+    if not docs_target_dir.is_dir():
+        return 0
+
+    removed = 0
+
+    for directory, dir_names, file_names in os.walk(docs_target_dir, topdown=False):
+        directory = Path(directory)
+
+        for file_name in file_names:
+            target_file = directory / file_name
+            if target_file.relative_to(docs_target_dir) not in outputs:
+                target_file.unlink()
+                ux.print(f' ... removed: {target_file}')
+                removed += 1
+
+        if directory != docs_target_dir and not any(directory.iterdir()):
+            directory.rmdir()
+
+    ux.print(f'... {removed} stale files removed')
+    return removed
+
+
+class AssetIndex:
+    # Everything in the asset source dir, scanned once and keyed by decoded,
+    #  unicode-normalized name. Asset references are resolved against it
+    #  instead of one exists() call per asset, which hurts on network drives
+
+    def __init__(self, full_asset_sourcedir: Path):
+        self.full_asset_sourcedir = full_asset_sourcedir
+        self.files: dict[str, Path] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        self.files.clear()
+
+        if not self.full_asset_sourcedir.is_dir():
+            return
 
-        exit()
+        for dir_path, _, file_names in os.walk(self.full_asset_sourcedir):
+            for file_name in file_names:
+                file_path = Path(dir_path, file_name)
+                relative_name = file_path.relative_to(
+                    self.full_asset_sourcedir).as_posix()
+                self.files[self.key(relative_name)] = file_path
 
+    @staticmethod
+    def key(asset_name: str) -> str:
+        # First decode html-entities
+        return unicodedata.normalize('NFC', urllib.parse.unquote(asset_name))
 
-def copy_assets(assets_dict: Asset_dict_type, full_asset_sourcedir: Path, full_asset_targetdir: Path):
+    def resolve(self, asset_name: str) -> Path | None:
+        return self.files.get(self.key(asset_name))
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+
+def copy_assets(assets_dict: Asset_dict_type, full_asset_sourcedir: Path, full_asset_targetdir: Path,
+                asset_index: AssetIndex | None = None) -> list[dict[str, str]]:
+    # Returns the missing assets, as {'asset': name used in pages,
+    #  'expected': where it should have been}
 
     ux.print(f'Creating asset directory {full_asset_targetdir}')
     full_asset_targetdir.mkdir(parents=True, exist_ok=True)
@@ -73,27 +222,152 @@ def copy_assets(assets_dict: Asset_dict_type, full_asset_sourcedir: Path, full_a
     # Copy and rename assets used in md-pages
     ux.print("\nStarting renaming and copying assets ...")
 
+    missing: list[dict[str, str]] = []
+
     if full_asset_sourcedir.exists():
-        for original_name, new_name in assets_dict.items():
-            # First decode html-entities
-            original_name = urllib.parse.unquote(original_name)
+        if asset_index is None:
+            asset_index = AssetIndex(full_asset_sourcedir)
+
+        # Deduplicated assets share a target, only copy it once
+        copy_targets: dict[Path, Path] = {}
 
+        for original_name, new_name in assets_dict.items():
             ux.print(f' {original_name} >> {new_name}')
 
-        # Prep new full names including paths
-            full_original_name = full_asset_sourcedir / original_name
-            full_new_name = full_asset_targetdir / new_name
+            source_file = asset_index.resolve(original_name)
 
-        # Check if image exists with html-entities name
-            if full_original_name.exists():
-                shutil.copy(str(full_original_name), str(full_new_name))
+            if source_file is not None:
+                copy_targets.setdefault(
+                    full_asset_targetdir / new_name, source_file)
             else:
-                ux.print(f' ... missing: {full_original_name}')
+                missing.append({
+                    'asset': original_name,
+                    'expected': (full_asset_sourcedir / AssetIndex.key(original_name)).as_posix()
+                })
+
+        if asset_processor is not None:
+            copy_targets = asset_processor(copy_targets)
+
+        # Assets that are already in place from an earlier run are skipped
+        filecopy.copy_many([(source_file, target_file)
+                            for target_file, source_file in copy_targets.items()])
 
-        ux.print(f'... all {len(assets_dict)} assets renamed and copied')
+        ux.print(f'... {len(assets_dict) - len(missing)} of {len(assets_dict)} assets renamed and copied')
+        print_missing_assets(missing)
     else:
         ux.print(f'... could not copy assets to {full_asset_targetdir}')
 
+    return missing
+
+
+def set_asset_processor(processor: Asset_processor_type | None) -> None:
+    global asset_processor
+    asset_processor = processor
+
+
+def print_missing_assets(missing: list[dict[str, str]]) -> None:
+    if not missing:
+        return
+
+    ux.print(f'\n{len(missing)} missing assets:')
+    for entry in missing:
+        ux.print(f' {entry["asset"]} (expected at {entry["expected"]})')
+
+
+class AssetDeduper:
+    # Asset namer (see filemod.set_asset_namer) that gives byte-identical
+    #  images the same name, so they're only copied and published once.
+    #  GitBook exports tend to have lots of those, e.g. 'image (1).png',
+    #  'image (2).png', ...
+
+    def __init__(self, asset_index: AssetIndex):
+        self.asset_index = asset_index
+        self.names_by_hash: dict[str, str] = {}
+
+        # By source file, size and mtime, so a file is hashed again once it
+        #  changed
+        self.hashes: dict[tuple[Path, int, int], str] = {}
+
+    def asset_hash(self, asset_name: str) -> str | None:
+        source_file = self.asset_index.resolve(asset_name)
+
+        if source_file is None:
+            return None
+
+        try:
+            stat = source_file.stat()
+        except FileNotFoundError:
+            return None
+
+        key = (source_file, stat.st_size, stat.st_mtime_ns)
+        if key not in self.hashes:
+            h = hashlib.sha1()
+            with source_file.open('rb') as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                    h.update(chunk)
+            self.hashes[key] = h.hexdigest()
+
+        return self.hashes[key]
+
+    def __call__(self, local_assets: Asset_dict_type, img_filename: Path) -> str:
+        if img_filename.name in local_assets:
+            return local_assets[img_filename.name]
+
+        asset_hash = self.asset_hash(img_filename.name)
+
+        if asset_hash in self.names_by_hash:
+            local_assets[img_filename.name] = self.names_by_hash[asset_hash]
+            return local_assets[img_filename.name]
+
+        img_new_filename = name_asset(local_assets, img_filename)
+        if asset_hash is not None:
+            self.names_by_hash[asset_hash] = img_new_filename
+
+        return img_new_filename
+
+
+class HashNamer(AssetDeduper):
+    # Asset namer that names images by a hash of their contents, or of their
+    #  name if they're missing, e.g. image-3f2a9c01b7de.png. Unlike image-N
+    #  names, these don't depend on the pages before them, so adding an image
+    #  doesn't rename the ones after it, and a name always means the same
+    #  contents. Identical images get the same name
+    hash_length = 12
+
+    def __call__(self, local_assets: Asset_dict_type, img_filename: Path) -> str:
+        # Always from the contents, a name handed out by an earlier run may
+        #  be for an older version of the image
+        asset_hash = self.asset_hash(img_filename.name) \
+            or manifest.file_hash(img_filename.name.encode('utf-8'))
+
+        local_assets[img_filename.name] = \
+            f'image-{asset_hash[:self.hash_length]}{img_filename.suffix}'
+        return local_assets[img_filename.name]
+
+
+asset_naming_modes: list[str] = ['counter', 'hash']
+
+
+def renamed_assets(namer: typing.Callable[[Asset_dict_type, Path], str],
+                   assets: Asset_dict_type) -> list[str]:
+    # Images named by an earlier run that namer names differently now, i.e.
+    #  whose contents changed when names are content hashes. Only meaningful
+    #  for namers that don't depend on the order images are found in. Files
+    #  (the file plugin) keep their names and aren't checked
+    return [original_name for original_name, new_name in assets.items()
+            if new_name != original_name and namer({}, Path(original_name)) != new_name]
+
+
+def make_asset_namer(asset_index: AssetIndex, naming: str = 'counter',
+                     dedupe: bool = False) -> typing.Callable[[Asset_dict_type, Path], str] | None:
+    # The namer for filemod.set_asset_namer, None for the default image-N
+    #  names
+    if naming == 'hash':
+        return HashNamer(asset_index)
+    if dedupe:
+        return AssetDeduper(asset_index)
+    return None
+
 
 def write_assets_json(docs_source_dir: Path, assets_dict: Asset_dict_type):
     # Write assets_dict to assets.json in source dir
@@ -104,20 +378,23 @@ def write_assets_json(docs_source_dir: Path, assets_dict: Asset_dict_type):
         ux.print("\nWriting assets.json")
 
 
+def extra_files(extra_source_dir: Path) -> dict[Path, Path]:
+    # Extra files by their path relative to the target dir
+    return {source_file.relative_to(extra_source_dir): source_file
+            for source_file in extra_source_dir.glob('**/*.*')}
+
+
 def copy_extra_files(docs_target_dir: Path, extra_source_dir: Path):
     if extra_source_dir.exists():
         ux.print('Copying extra files')
-        for source_file in extra_source_dir.glob('**/*.*'):
-            target_file: Path = docs_target_dir / \
-                source_file.relative_to(extra_source_dir)
+        copy_pairs: list[filecopy.Copy_pair_type] = []
+        for extra_file, source_file in extra_files(extra_source_dir).items():
+            target_file: Path = docs_target_dir / extra_file
             ux.print(f' {source_file} >> {target_file}')
 
-            target_file.parent.mkdir(parents=True, exist_ok=True)
+            copy_pairs.append((source_file, target_file))
 
-            shutil.copy(
-                source_file,
-                target_file
-            )
+        filecopy.copy_many(copy_pairs)
         ux.print("...copied extra files")
     else:
         ux.print(
@@ -1,17 +1,75 @@
+import contextlib
 import re
+import signal
+import threading
+from itertools import repeat
 from pathlib import Path
 from textwrap import indent
-import uuid
+import typing
 
 from fileman import Asset_dict_type
+import fileman
+import manifest
+import profiler
 import ux
 
 import re_apply
+from re_apply.plugins.images import name_asset
 
 # Local globals
 local_assets_dict: Asset_dict_type = {}
 
-code_block_dict: dict[str, str] = {}
+# Names the assets the images plugin finds, see set_asset_namer
+Asset_namer_type = typing.Callable[[Asset_dict_type, Path], str]
+asset_namer: Asset_namer_type = name_asset
+
+# Pages are handed to worker processes in batches of roughly this many bytes
+batch_size_bytes = 64 * 1024
+
+# Seconds a page may take to convert, 0 for no limit. A page that takes
+#  longer (e.g. a pattern backtracking on malformed markup) is passed through
+#  unchanged and listed in over_budget_pages
+page_time_budget: float = 0.0
+over_budget_pages: list[Path] = []
+
+# Every page's output path, for the link plugin to resolve links against.
+#  Links to pages that aren't in it are collected as (page, link)
+page_index: fileman.Page_index_type = {}
+broken_links: list[tuple[str, str]] = []
+
+# Where convert_files wrote every page, by the same keys as page_index. It's
+#  what the build actually left in the target dir, so stale files are found
+#  by it rather than by page_index
+page_outputs: fileman.Page_index_type = {}
+
+Asset_event_type = tuple[str, str, str]
+
+# Converted text with asset placeholders, the asset events that go with it,
+#  the pages its links were resolved against (output path, None if missing)
+#  and its broken links
+Cached_page_type = tuple[str, list[Asset_event_type], dict[str, str | None],
+                         list[tuple[str, str]]]
+
+# Pages converted for one book are reused for other books converted by the
+#  same process, e.g. versions of one book, by a hash of their path and
+#  source. A key holds a variant for every set of pages the page's links
+#  were resolved against, so books that differ there don't push each other
+#  out. None when not in use, see enable_conversion_cache
+conversion_cache: dict[str, list[Cached_page_type]] | None = None
+
+# Pages converted while the cache was in use, as opposed to taken from it
+conversion_count: int = 0
+
+# Entries added to the cache, for worker processes to send back
+cache_additions: list[tuple[str, Cached_page_type]] = []
+
+# A page function turns a task into (target file, new contents, extra info).
+#  Contents of None means there's nothing to write
+Page_result_type = tuple[Path, str | None, object]
+Page_function_type = typing.Callable[[typing.Any, Path, Path], Page_result_type]
+
+# Source dir, target dir, page relative to both, previous manifest entry
+Convert_task_type = tuple[Path, Path, Path, manifest.Page_entry_type | None]
 
 
 # region Declare regexp patterns & result handlers #############################
@@ -22,24 +80,57 @@ gb_codeblock_pattern = re.compile(
     r'(?P<indent> *?)```(?P<content>[\S\s]*?)```')
 
 
-def code_block_to_uuid(match: re.Match[str]) -> str:
-    block_content = str(match.group('content'))
-    block_uuid = str(uuid.uuid4())
-    code_block_dict[block_uuid] = block_content
+def protect_code_blocks(filedata: str) -> tuple[str, re_apply.ProtectedSpans]:
+    # Record where code blocks are, so the plugins leave them alone.
+    #  Any indent in front of a block is dropped, indent_code_blocks puts
+    #  back whatever indent the block ends up with
+    spans: list[tuple[int, int]] = []
+    parts: list[str] = []
+    pos = 0
+    length = 0
 
-    return f'```{block_uuid}```'
+    for match in gb_codeblock_pattern.finditer(filedata):
+        parts.append(filedata[pos:match.start()])
+        length += match.start() - pos
 
+        block_start = match.start('content') - 3
+        spans.append((length, length + match.end() - block_start))
+        length += match.end() - block_start
 
-def code_uuid_to_block(match: re.Match[str]) -> str:
-    block_uuid = str(match.group('content'))
-    block_indent = str(match.group('indent'))
-    if block_uuid in code_block_dict:
-        block_content = code_block_dict[block_uuid]
-    else:
-        block_content = block_uuid
+        parts.append(filedata[block_start:match.end()])
+        pos = match.end()
 
+    # Only build a new string if some block was indented
+    if length + len(filedata) - pos != len(filedata):
+        parts.append(filedata[pos:])
+        filedata = ''.join(parts)
+
+    return (filedata, re_apply.ProtectedSpans(spans))
+
+
+def indent_code_blocks(filedata: str, protected: re_apply.ProtectedSpans) -> str:
     # Take the opportunity to match indent of all lines
-    return indent(f'```{block_content}```', block_indent)
+    parts: list[str] = []
+    pos = 0
+
+    for block_start, block_end in protected.spans:
+        indent_start = block_start
+        while indent_start > pos and filedata[indent_start - 1] == ' ':
+            indent_start -= 1
+
+        if indent_start == block_start:
+            continue
+
+        parts.append(filedata[pos:indent_start])
+        parts.append(indent(filedata[block_start:block_end],
+                            filedata[indent_start:block_start]))
+        pos = block_end
+
+    if not parts:
+        return filedata
+
+    parts.append(filedata[pos:])
+    return ''.join(parts)
 
 # endregion ####################################################################
 # ===============================================================================
@@ -50,6 +141,51 @@ def code_uuid_to_block(match: re.Match[str]) -> str:
 gb_removals = re.compile(r'{% tabs %}|{% endtabs %}|{% endembed %}|<\/?div>')
 
 
+class PageTimeout(Exception):
+    pass
+
+
+def can_limit_time() -> bool:
+    return hasattr(signal, 'setitimer') \
+        and threading.current_thread() is threading.main_thread()
+
+
+@contextlib.contextmanager
+def time_limit(seconds: float) -> typing.Iterator[None]:
+    # Raises PageTimeout in the block once it has run for that long. The re
+    #  module checks for signals while matching, so this also stops a pattern
+    #  that's stuck backtracking. Without SIGALRM (Windows) or outside the
+    #  main thread the block runs without a limit
+    if seconds <= 0 or not can_limit_time():
+        yield
+        return
+
+    armed = True
+
+    def on_alarm(signum: int, frame: object) -> None:
+        if armed:
+            raise PageTimeout()
+
+    previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+        armed = False
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def set_page_time_budget(seconds: float) -> None:
+    global page_time_budget
+    page_time_budget = max(0.0, seconds)
+
+
+def set_asset_namer(namer: Asset_namer_type | None) -> None:
+    global asset_namer
+    asset_namer = namer if namer is not None else name_asset
+
+
 def make_replacements(filedata: str, asset_source_dir: Path, asset_target_dir: Path) -> str:
 
     global local_assets_dict
@@ -61,21 +197,19 @@ def make_replacements(filedata: str, asset_source_dir: Path, asset_target_dir: P
     # Symbol replacements
     filedata = filedata.replace('&#x20;', ' ')
 
-    # Reset dict of uuids and code block contents
-    global code_block_dict
-    code_block_dict = {}
-
     # Fix code blocks
-    filedata = re_apply.apply(filedata, inc=['code'])
+    filedata = re_apply.apply(filedata, inc=['code'],
+                              callback=profiler.callback())
 
-    # Replace all code blocks' contents with uuids
-    filedata = gb_codeblock_pattern.sub(code_block_to_uuid, filedata)
+    # Keep the plugins out of code blocks' contents
+    filedata, protected = protect_code_blocks(filedata)
 
     # Apply a bunch of replacements (code, tags, etc)
-    filedata = re_apply.apply(filedata, exc=['code'])
+    filedata = re_apply.apply(filedata, exc=['code'], protected=protected,
+                              callback=profiler.callback())
 
-    # Replace uuids within code blocks with their contents
-    filedata = gb_codeblock_pattern.sub(code_uuid_to_block, filedata)
+    # Indent code blocks to wherever they ended up
+    filedata = indent_code_blocks(filedata, protected)
 
     # Stuff to remove
     filedata = gb_removals.sub('', filedata)
@@ -86,34 +220,515 @@ def make_replacements(filedata: str, asset_source_dir: Path, asset_target_dir: P
     return filedata
 
 
-def modify_files(docs_target_dir: Path, asset_source_dir: Path, asset_target_dir: Path) -> Asset_dict_type:
+def make_replacements_within_budget(filedata: str, asset_source_dir: Path, asset_target_dir: Path,
+                                    page: Path) -> str:
+    # make_replacements, but a page going over page_time_budget is returned
+    #  unchanged instead of holding up the build
+    try:
+        with time_limit(page_time_budget):
+            return make_replacements(filedata, asset_source_dir, asset_target_dir)
+    except PageTimeout:
+        over_budget_pages.append(page)
+        ux.print(f' ... over the time budget, passed through unchanged: {page}')
+        return filedata
+
+
+# region Fused copy & modify ###################################################
+################################################################################
+
+# Reads every source page once, and writes its final, modified version once,
+#  straight to its (possibly .hidden) target.
+
+def convert_files(docs_source_dir: Path, docs_target_dir: Path,
+                  asset_source_dir: Path, asset_target_dir: Path,
+                  build_manifest: manifest.Manifest_type | None = None,
+                  known_assets: Asset_dict_type | None = None,
+                  jobs: int = 1,
+                  md_files: list[Path] | None = None) -> Asset_dict_type:
+    # md_files limits conversion to those pages (relative to the source
+    #  dir), e.g. the ones that were just edited. Listed pages that no
+    #  longer exist have their output removed, other pages aren't touched
+    known_assets = dict(known_assets) if known_assets else {}
     local_assets_dict.clear()
+    local_assets_dict.update(known_assets)
+    cache_additions.clear()
+
+    old_pages = manifest.pages(build_manifest) if build_manifest else {}
+
+    if md_files is None:
+        md_files = fileman.list_pages(docs_source_dir)
+        checked_pages = set(old_pages.keys())
+        new_pages: dict[str, manifest.Page_entry_type] = {}
+
+        page_index.clear()
+        page_index.update(fileman.build_page_index(docs_source_dir, md_files))
+        page_outputs.clear()
+    else:
+        checked_pages = {md_file.as_posix() for md_file in md_files}
+        md_files = [md_file for md_file in md_files
+                    if (docs_source_dir / md_file).is_file()]
+        new_pages = dict(old_pages)
+
+        for page_key in checked_pages:
+            page_index.pop(page_key, None)
+        page_index.update(fileman.build_page_index(docs_source_dir, md_files))
+
+    # Links to a page change with its hidden state, so when a page is
+    #  hidden, unhidden, or a hidden page is added or removed, every page is
+    #  converted again
+    old_hidden = {page_key: entry['output'] for page_key, entry in old_pages.items()
+                  if entry['output'] != page_key}
+    new_hidden = {page_key: output for page_key, output in page_index.items()
+                  if output != page_key}
+    if old_pages and old_hidden != new_hidden:
+        md_files = fileman.list_pages(docs_source_dir)
+        old_pages = {page_key: {**entry, 'hash': ''}
+                     for page_key, entry in old_pages.items()}
+
+    ux.print(f'\nStarting to convert md-pages from {docs_source_dir} ...')
+
+    tasks: list[Convert_task_type] = [
+        (docs_source_dir, docs_target_dir, md_file,
+         old_pages.get(md_file.as_posix()))
+        for md_file in md_files]
+
+    results = run_pages(tasks, convert_page,
+                        asset_source_dir, asset_target_dir, jobs)
+
+    f_count = 0
+
+    for md_file, (target_file, entry) in zip(md_files, results):
+        page_key = md_file.as_posix()
+        new_entry: manifest.Page_entry_type = entry  # type: ignore
+        new_pages[page_key] = new_entry
+        page_outputs[page_key] = target_file.relative_to(docs_target_dir).as_posix()
+        checked_pages.discard(page_key)
+
+        if page_key in old_pages and old_pages[page_key] != new_entry:
+            f_count += 1
+            # Hidden state changed, get rid of the old output
+            old_output = docs_target_dir / str(old_pages[page_key]['output'])
+            if old_output != target_file:
+                old_output.unlink(missing_ok=True)
+        elif page_key not in old_pages:
+            f_count += 1
+
+    # Sources that disappeared since last run
+    for page_key in checked_pages & old_pages.keys():
+        old_output = docs_target_dir / str(old_pages[page_key]['output'])
+        old_output.unlink(missing_ok=True)
+        new_pages.pop(page_key, None)
+        page_outputs.pop(page_key, None)
+        ux.print(f' ... removed: {old_output}')
+
+    if build_manifest is not None:
+        build_manifest['pages'] = new_pages
+
+    ux.print(f'... done converting md-pages tree ({f_count} pages)')
+    return local_assets_dict
+
+
+def convert_page(task: Convert_task_type, asset_source_dir: Path, asset_target_dir: Path) -> Page_result_type:
+    docs_source_dir, docs_target_dir, md_file, old_entry = task
+
+    source_file = docs_source_dir / md_file
+    target_file = docs_target_dir / md_file
+
+    data = source_file.read_bytes()
+    page_hash = manifest.file_hash(data)
+
+    # Unchanged source and output still in place: leave it alone
+    if old_entry and old_entry['hash'] == page_hash:
+        old_output = docs_target_dir / str(old_entry['output'])
+        if old_output.is_file():
+            return (old_output, None, old_entry)
+
+    over_budget = len(over_budget_pages)
+
+    # Read as bytes for the hash; GitBook exports made on Windows have CRLF
+    #  line ends, which the plugins' patterns don't expect
+    target_file, hidden, filedata = convert_text(
+        data.decode('utf-8').replace('\r\n', '\n'), target_file,
+        asset_source_dir, asset_target_dir, md_file)
+
+    # A page passed through unconverted isn't up to date, the next
+    #  incremental build tries again
+    if len(over_budget_pages) > over_budget:
+        page_hash = ''
+
+    entry: manifest.Page_entry_type = {
+        'hash': page_hash,
+        'hidden': hidden,
+        'output': target_file.relative_to(docs_target_dir).as_posix()
+    }
+
+    return (target_file, filedata, entry)
+
+def convert_text(filedata: str, target_file: Path,
+                 asset_source_dir: Path, asset_target_dir: Path,
+                 md_file: Path | None = None) -> tuple[Path, bool, str]:
+    # Converts a page's source text. Returns where it goes (.hidden for
+    #  hidden pages), whether it's hidden and the converted text. md_file is
+    #  the page's path relative to the source dir, for resolving its links
+    is_summary = target_file.name == 'SUMMARY.md'
+
+    hidden = fileman.is_hidden(fileman.read_frontmatter_text(filedata))
+    if hidden:
+        target_file = fileman.hidden_name(target_file)
+
+    if not is_summary:
+        re_apply.set_local('link', 'file', target_file)
+        re_apply.set_local('link', 'page', md_file)
+
+        if conversion_cache is not None and md_file is not None:
+            filedata = convert_cached(
+                filedata, md_file, asset_source_dir, asset_target_dir, target_file)
+        else:
+            filedata = make_replacements_within_budget(
+                filedata, asset_source_dir, asset_target_dir, target_file)
 
-    ux.print(f'\nStarting to modify md-pages in {docs_target_dir} ...')
+    return (target_file, hidden, filedata)
+
+
+# region Conversion cache ######################################################
+################################################################################
+
+# A page's conversion only depends on its source, its path and the pages it
+#  links to, except for asset names, which depend on the pages converted
+#  before it. So pages are cached with placeholders for their asset names
+#  (as in parallel runs) and the names are handed out again for every book.
+
+class PageIndexLog(dict[str, str]):
+    # Stands in for page_index, recording what's looked up in it
+    def __init__(self, index: fileman.Page_index_type):
+        super().__init__()
+        self.index = index
+        self.lookups: dict[str, str | None] = {}
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        output = self.index.get(key)
+        self.lookups[key] = output
+        return output if output is not None else default
+
+
+def enable_conversion_cache(enabled: bool = True) -> None:
+    global conversion_cache
+    if not enabled:
+        conversion_cache = None
+    elif conversion_cache is None:
+        conversion_cache = {}
+
+
+def convert_cached(filedata: str, md_file: Path,
+                   asset_source_dir: Path, asset_target_dir: Path, target_file: Path) -> str:
+    assert conversion_cache is not None
+
+    global conversion_count
+
+    key = manifest.file_hash(f'{md_file.as_posix()}\0{filedata}'.encode('utf-8'))
+
+    # Links may resolve differently against this book's pages
+    entry = next((variant for variant in conversion_cache.get(key, [])
+                  if all(page_index.get(target) == output
+                         for target, output in variant[2].items())), None)
+
+    if entry is None:
+        conversion_count += 1
+        entry = convert_for_cache(filedata, asset_source_dir, asset_target_dir, target_file)
+
+        if entry is None:
+            return filedata
+
+        add_to_cache(key, entry)
+        cache_additions.append((key, entry))
+
+    text, events, _, page_broken_links = entry
+    broken_links.extend(page_broken_links)
+
+    assets = re_apply.get_local('images', 'assets')
+    if not isinstance(assets, dict):
+        assets = re_apply.get_local('file', 'assets')
+    namer = re_apply.get_local('images', 'namer') or asset_namer
+
+    return replay_asset_events(text, events, assets, namer)  # type: ignore
+
+
+def add_to_cache(key: str, entry: Cached_page_type) -> None:
+    # Parallel workers may send the same variant more than once
+    assert conversion_cache is not None
+
+    variants = conversion_cache.setdefault(key, [])
+    if all(variant[2] != entry[2] for variant in variants):
+        variants.append(entry)
+
+
+def convert_for_cache(filedata: str, asset_source_dir: Path, asset_target_dir: Path,
+                      target_file: Path) -> Cached_page_type | None:
+    # Converts a page with placeholders for its asset names. Returns None if
+    #  it went over the time budget, which isn't worth caching
+    saved = [(plugin_name, key, re_apply.get_local(plugin_name, key))
+             for plugin_name, key in (('images', 'assets'), ('images', 'namer'),
+                                      ('file', 'assets'),
+                                      ('link', 'pages'), ('link', 'broken'))]
+
+    asset_log = AssetLog()
+    index_log = PageIndexLog(page_index)
+    page_broken_links: list[tuple[str, str]] = []
+
+    re_apply.set_local('images', 'assets', asset_log)
+    re_apply.set_local('images', 'namer', asset_log.name_image)
+    re_apply.set_local('file', 'assets', asset_log)
+    re_apply.set_local('link', 'pages', index_log)
+    re_apply.set_local('link', 'broken', page_broken_links)
+
+    over_budget = len(over_budget_pages)
+
+    try:
+        text = make_replacements_within_budget(
+            filedata, asset_source_dir, asset_target_dir, target_file)
+    finally:
+        for plugin_name, key, value in saved:
+            re_apply.set_local(plugin_name, key, value)
+
+    if len(over_budget_pages) > over_budget:
+        return None
+
+    return (text, asset_log.events, index_log.lookups, page_broken_links)
+
+# endregion ####################################################################
+
+# endregion ####################################################################
+
+
+def run_pages(tasks: typing.Sequence[typing.Any], page_function: Page_function_type,
+              asset_source_dir: Path, asset_target_dir: Path,
+              jobs: int = 1) -> list[tuple[Path, object]]:
+    # Runs page_function for every task, serially or in a process pool,
+    #  writes the results and returns (target file, extra info) per task
+    if jobs > 1 and len(tasks) > 1:
+        return run_pages_parallel(tasks, page_function,
+                                  asset_source_dir, asset_target_dir, jobs)
 
     re_apply.set_local('images', 'assets', local_assets_dict)
+    re_apply.set_local('images', 'namer', asset_namer)
     re_apply.set_local('file', 'assets', local_assets_dict)
+    use_page_index()
 
+    results: list[tuple[Path, object]] = []
 
-    f_count = 0
+    for task in tasks:
+        profiler.start_page()
+        target_file, filedata, info = page_function(
+            task, asset_source_dir, asset_target_dir)
+        page_profile = profiler.end_page(target_file)
 
-    for md_file in docs_target_dir.glob('**/*.md'):
-        # Skip summary file
-        if md_file.name == 'SUMMARY.md':
-            continue
-        ux.print(f' parsing: {md_file}')
-        re_apply.set_local('link', 'file', md_file)
-            
-        filedata = md_file.read_text(encoding='utf-8')
+        if filedata is not None:
+            ux.print(f' parsing: {target_file}')
+            write_page(target_file, filedata)
+            profiler.add_page(page_profile)
 
-        filedata = make_replacements(
-            filedata, asset_source_dir, asset_target_dir)
+        results.append((target_file, info))
 
-        md_file.write_text(filedata, encoding='utf-8')
-        f_count += 1
+    return results
 
-    # re_apply.set_local('images', 'assets', local_assets_dict)
-    # local_assets_dict: dict[str, str] = re_apply.get_local('images', 'assets')
 
-    ux.print(f'... done modifying md-pages tree ({f_count} pages)')
-    return local_assets_dict
+def init_worker(index: fileman.Page_index_type, use_cache: bool,
+                engine: str, plugins: list[str], visible: bool) -> None:
+    # Spawned workers start from a fresh import, so they get the main
+    #  process's settings here rather than inheriting them
+    ux.set_visible(visible)
+    re_apply.set_engine(engine)
+    re_apply.set_plugins(plugins)
+    use_page_index(index)
+    enable_conversion_cache(use_cache)
+
+
+def use_page_index(index: fileman.Page_index_type | None = None) -> None:
+    # Worker processes get a copy of the index from the main process (forked
+    #  workers already have it)
+    if index is not None and index is not page_index:
+        page_index.clear()
+        page_index.update(index)
+
+    re_apply.set_local('link', 'pages', page_index)
+    re_apply.set_local('link', 'broken', broken_links)
+
+
+def write_page(target_file: Path, filedata: str) -> None:
+    target_file.parent.mkdir(parents=True, exist_ok=True)
+    target_file.write_text(filedata, encoding='utf-8')
+
+
+# region Parallel modification #################################################
+################################################################################
+
+# Asset names depend on every page processed before them, so workers can't
+#  name assets themselves. Instead they record what the images and file
+#  plugins discover and leave a placeholder in the text. The main process
+#  then replays the records in page order against the real assets dict,
+#  which hands out exactly the names a serial run would.
+
+asset_placeholder_pattern = re.compile(r'\x00asset-(?P<index>\d+)\x00')
+
+
+class AssetLog(dict[str, str]):
+    def __init__(self):
+        super().__init__()
+        self.events: list[Asset_event_type] = []
+
+    def __setitem__(self, key: str, value: str) -> None:
+        self.events.append(('file', key, value))
+        super().__setitem__(key, value)
+
+    def name_image(self, local_assets: dict[str, str], img_filename: Path) -> str:
+        placeholder = f'\x00asset-{len(self.events)}\x00'
+        self.events.append(('image', str(img_filename), placeholder))
+        return placeholder
+
+
+# Whether a page went over the time budget, its broken links, what it
+#  added to the conversion cache and whether it was converted rather than
+#  taken from the cache
+Page_notes_type = tuple[bool, list[tuple[str, str]], list[tuple[str, Cached_page_type]],
+                        bool]
+
+# Target file, contents left to write, whether the worker wrote it already,
+#  asset events, extra info from the page function, the page's profile and
+#  notes about the page
+Batch_result_type = tuple[Path, str | None, bool,
+                          list[Asset_event_type], object,
+                          profiler.Page_profile_type | None, Page_notes_type]
+
+
+def replay_asset_events(filedata: str, events: list[Asset_event_type],
+                        assets: Asset_dict_type, namer: Asset_namer_type) -> str:
+    # Names the assets recorded by an AssetLog, in order, and puts the names
+    #  in place of the placeholders
+    new_names: dict[str, str] = {}
+    for kind, name, value in events:
+        if kind == 'image':
+            new_names[value] = namer(assets, Path(name))
+        elif name not in assets:
+            assets[name] = value
+
+    return asset_placeholder_pattern.sub(lambda m: new_names[m[0]], filedata)
+
+
+def task_size(task: typing.Any) -> int:
+    docs_source_dir, _, md_file, _ = task
+    return (docs_source_dir / md_file).stat().st_size
+
+
+def make_batches(tasks: typing.Sequence[typing.Any]) -> list[list[typing.Any]]:
+    # Group consecutive pages so small pages don't cost one IPC round-trip each
+    batches: list[list[typing.Any]] = []
+    batch: list[typing.Any] = []
+    batch_size = 0
+
+    for task in tasks:
+        batch.append(task)
+        batch_size += task_size(task)
+
+        if batch_size >= batch_size_bytes:
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def run_batch(batch: list[typing.Any], page_function: Page_function_type,
+              asset_source_dir: Path, asset_target_dir: Path,
+              profiling: bool = False, time_budget: float = 0.0) -> list[Batch_result_type]:
+    # Runs in a worker process. Pages without images are final and written
+    #  right away, the others are sent back for their assets to be named
+    results: list[Batch_result_type] = []
+    profiler.enable(profiling)
+    set_page_time_budget(time_budget)
+
+    for task in batch:
+        asset_log = AssetLog()
+        re_apply.set_local('images', 'assets', asset_log)
+        re_apply.set_local('images', 'namer', asset_log.name_image)
+        re_apply.set_local('file', 'assets', asset_log)
+
+        over_budget = len(over_budget_pages)
+        broken = len(broken_links)
+        added = len(cache_additions)
+        converted = conversion_count
+
+        profiler.start_page()
+        target_file, filedata, info = page_function(
+            task, asset_source_dir, asset_target_dir)
+        page_profile = profiler.end_page(target_file)
+
+        notes: Page_notes_type = (len(over_budget_pages) > over_budget,
+                                  broken_links[broken:], cache_additions[added:],
+                                  conversion_count > converted)
+
+        if filedata is not None \
+                and not any(kind == 'image' for kind, _, _ in asset_log.events):
+            write_page(target_file, filedata)
+            results.append((target_file, None, True, asset_log.events, info,
+                            page_profile, notes))
+        else:
+            results.append((target_file, filedata, False, asset_log.events, info,
+                            page_profile, notes))
+
+    return results
+
+
+def run_pages_parallel(tasks: typing.Sequence[typing.Any], page_function: Page_function_type,
+                       asset_source_dir: Path, asset_target_dir: Path,
+                       jobs: int) -> list[tuple[Path, object]]:
+    global conversion_count
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    batches = make_batches(tasks)
+
+    ux.print(f' using {jobs} processes for {len(batches)} batches')
+
+    results: list[tuple[Path, object]] = []
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(page_index, conversion_cache is not None,
+                                       re_apply.engine, re_apply.plugins_to_use,
+                                       ux.visible)) as executor:
+        batch_results = executor.map(
+            run_batch, batches, repeat(page_function),
+            repeat(asset_source_dir), repeat(asset_target_dir),
+            repeat(profiler.enabled), repeat(page_time_budget))
+
+        # map() yields in submission order, i.e. serial page order
+        for batch_result in batch_results:
+            for target_file, filedata, written, events, info, page_profile, notes \
+                    in batch_result:
+                if written or filedata is not None:
+                    ux.print(f' parsing: {target_file}')
+                    profiler.add_page(page_profile)
+
+                over_budget, page_broken_links, page_cache_additions, converted = notes
+                if over_budget:
+                    over_budget_pages.append(target_file)
+                broken_links.extend(page_broken_links)
+                if conversion_cache is not None:
+                    for key, entry in page_cache_additions:
+                        add_to_cache(key, entry)
+                conversion_count += converted
+
+                if filedata is not None:
+                    filedata = replay_asset_events(
+                        filedata, events, local_assets_dict, asset_namer)
+                    write_page(target_file, filedata)
+                else:
+                    replay_asset_events('', events, local_assets_dict, asset_namer)
+
+                results.append((target_file, info))
+
+    return results
+
+# endregion ####################################################################
@@ -4,14 +4,20 @@
 # - https://lukasgeiter.github.io/mkdocs-awesome-nav/
 
 # TODO: Proper instructions in README
-# FIXME: Links to hidden files need to be recognized
 
+import sys
+import time
 from pathlib import Path
 from argparse import ArgumentParser
 
 import filemod
 import summary_nav_yml
+import filecopy
 import fileman
+import imageopt
+import manifest
+import profiler
+import re_apply
 import ux
 
 
@@ -27,90 +33,457 @@ parser.add_argument('--generate-nav', '-n',
                     default=True,
                     choices=(True, False),
                     help='Using SUMMARY.md, generate .nav.yml files for root and all subdirectories. Used by awesome-nav plugin')
+parser.add_argument('--incremental', '-i',
+                    action='store_true',
+                    help='Keep the target directory and only convert pages changed since the last run'
+                    )
+parser.add_argument('--jobs', '-j',
+                    type=int,
+                    default=1,
+                    help='Number of processes used to modify pages'
+                    )
+parser.add_argument('--engine', '-e',
+                    choices=re_apply.engines,
+                    default=re_apply.engine,
+                    help='How plugins are applied: "scan" only skips plugins whose gate isn\'t in a page, output is the same'
+                    )
+parser.add_argument('--plugins',
+                    type=str,
+                    default=None,
+                    help=f'Comma separated plugins to apply, all by default ({",".join(re_apply.plugin_registry)})'
+                    )
+parser.add_argument('--skip-plugins',
+                    type=str,
+                    default='',
+                    help='Comma separated plugins not to apply'
+                    )
+parser.add_argument('--copy-mode',
+                    choices=filecopy.copy_modes,
+                    default=filecopy.copy_mode,
+                    help='How assets and extra files are copied: regular copies, copy-on-write clones or hard links'
+                    )
+parser.add_argument('--copy-threads',
+                    type=int,
+                    default=filecopy.copy_threads,
+                    help='Number of threads copying files'
+                    )
+parser.add_argument('--dedupe-assets',
+                    action='store_true',
+                    help='Give byte-identical images the same name, so they are only copied once'
+                    )
+parser.add_argument('--asset-names',
+                    choices=fileman.asset_naming_modes,
+                    default='counter',
+                    help='Name images image-N in the order they are found, or by a hash of their contents, which keeps names stable between builds'
+                    )
+parser.add_argument('--optimize-images',
+                    choices=['webp', 'png'],
+                    default=None,
+                    help='Scale down wide images and re-encode them as WebP, or as optimized PNG/JPEG, caching the results. Needs Pillow'
+                    )
+parser.add_argument('--image-max-width',
+                    type=int,
+                    default=1600,
+                    help='Images wider than this are scaled down when optimizing images, 0 to keep their size'
+                    )
+parser.add_argument('--image-cache',
+                    metavar='CACHE_DIR',
+                    default=None,
+                    help='Where optimized images are cached, ~/.cache/gitbook2mkdocs/images by default'
+                    )
+parser.add_argument('--batch',
+                    metavar='PAIRS_FILE',
+                    help='Convert every source and target directory pair listed in this file in one process, converting pages that are the same in several of them once'
+                    )
+parser.add_argument('--archive',
+                    metavar='ARCHIVE_FILE',
+                    help='Write the converted site into a .zip or .tar(.gz/.bz2/.xz) archive instead of the target directory'
+                    )
+parser.add_argument('--check',
+                    action='store_true',
+                    help='Only compare what a build would produce with the target directory, list differing files and exit with status 1 if any, without writing anything'
+                    )
+parser.add_argument('--watch', '-w',
+                    action='store_true',
+                    help='After converting, keep watching the source directory and convert changed pages'
+                    )
+parser.add_argument('--page-time-budget',
+                    type=float,
+                    default=30.0,
+                    metavar='SECONDS',
+                    help='Pages taking longer than this to convert are passed through unchanged and reported, 0 for no limit'
+                    )
+parser.add_argument('--profile',
+                    metavar='REPORT_FILE',
+                    help='Record time, matches and bytes changed per plugin, pattern and page, and write them to a JSON report'
+                    )
+parser.add_argument('--profile-top',
+                    type=int,
+                    default=10,
+                    help='Number of slowest plugins and pages shown when profiling'
+                    )
 parser.add_argument('--silent', '-s',
                     action='store_true',
                     help='Run silently'
                     )
 
-# Parse args into dict
-args = vars(parser.parse_args())
-
-# endregion --------------------------------------------------------------------
-# ##############################################################################
-
-# region INITIALIZE ############################################################
-# ------------------------------------------------------------------------------
-
-ux.set_visible(not args['silent'])
 
-ux.print("Starting...")
+def print_broken_links(start: int) -> None:
+    # Reports the broken links found since start
+    broken_links = filemod.broken_links[start:]
+    if broken_links:
+        ux.print(f'\n{len(broken_links)} links go to pages that don\'t exist:')
+        for page, link in broken_links:
+            ux.print(f' {page}: {link}')
+
+
+def plugin_list(option: str, value: str) -> list[str]:
+    # Names from a comma separated --plugins/--skip-plugins value, reported
+    #  as a usage error if one isn't a plugin
+    plugin_names = [plugin_name.strip() for plugin_name in value.split(',')
+                    if plugin_name.strip()]
+
+    unknown = [plugin_name for plugin_name in plugin_names
+               if plugin_name not in re_apply.plugin_registry]
+    if unknown:
+        parser.error(f'{option}: unknown plugin {", ".join(repr(name) for name in unknown)} '
+                     f'(choose from {", ".join(re_apply.plugin_registry)})')
+
+    return plugin_names
+
+
+def main(argv: list[str] | None = None) -> int:
+    # Parse args into dict
+    args = vars(parser.parse_args(argv))
+
+    use_plugins = None
+    if args['plugins'] is not None:
+        use_plugins = plugin_list('--plugins', args['plugins'])
+        if not use_plugins:
+            parser.error('--plugins needs at least one plugin, use --skip-plugins to leave some out')
+    skip_plugins = plugin_list('--skip-plugins', args['skip_plugins'])
+
+    if args['batch'] and (args['incremental'] or args['watch'] or args['check']):
+        parser.error('--batch can\'t be combined with --incremental, --watch or --check')
+
+    book_pairs: list[tuple[Path, Path]] = []
+    if args['batch']:
+        import batch
+
+        try:
+            book_pairs = batch.read_pairs(Path(args['batch']))
+        except OSError as e:
+            parser.error(f'--batch: cannot read {args["batch"]}: {e.strerror}')
+        except ValueError as e:
+            parser.error(f'--batch: {e}')
+
+    if args['archive']:
+        import archive
+
+        if args['batch'] or args['incremental'] or args['watch'] or args['check']:
+            parser.error('--archive can\'t be combined with --batch, --incremental, --watch or --check')
+        if archive.archive_format(Path(args['archive'])) is None:
+            parser.error('--archive needs a .zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz file')
+
+    # endregion ----------------------------------------------------------------
+    # ##########################################################################
+
+    # region INITIALIZE ########################################################
+    # --------------------------------------------------------------------------
+
+    ux.set_visible(not args['silent'])
+    re_apply.set_engine(args['engine'])
+    re_apply.set_plugins(use_plugins, skip_plugins)
+    filecopy.set_mode(args['copy_mode'], args['copy_threads'])
+    profiler.enable(args['profile'] is not None)
+    filemod.set_page_time_budget(args['page_time_budget'])
+
+    # Left over from an earlier call, e.g. in tests
+    filemod.broken_links.clear()
+    filemod.over_budget_pages.clear()
+    fileman.set_asset_processor(None)
+
+    ux.print("Starting...")
+
+    image_optimizer = None
+    if args['optimize_images']:
+        if imageopt.pillow_available():
+            image_optimizer = imageopt.ImageOptimizer(
+                Path(args['image_cache']) if args['image_cache'] else imageopt.default_cache_dir(),
+                args['optimize_images'], args['image_max_width'], args['jobs'])
+            fileman.set_asset_processor(image_optimizer)
+        else:
+            ux.print(" Pillow isn't installed, images are copied as they are")
+
+    # Root folders for gitbook (source) and mkdocs (target)
+    docs_source_dir = Path(args['source_path'])
+    docs_target_dir = Path(args['target_path'])
+
+    # Stylesheet source folder
+    extra_source_dir = Path("extra")
+
+    # Image subfolder names
+    asset_source_dir = Path(".gitbook/assets")
+    asset_target_dir = Path("assets")
+
+    # Autogen
+    full_asset_targetdir = Path(docs_target_dir, asset_target_dir)
+    full_asset_sourcedir = Path(docs_source_dir, asset_source_dir)
+
+    if args['batch']:
+        try:
+            batch.run(book_pairs, extra_source_dir,
+                      asset_source_dir, asset_target_dir,
+                      generate_nav=args['generate_nav'], jobs=args['jobs'],
+                      dedupe_assets=args['dedupe_assets'], asset_names=args['asset_names'],
+                      image_optimizer=image_optimizer)
+        except imageopt.ImageEncodingError as e:
+            print(f'Error: {e}', file=sys.stderr)
+            return 1
+
+        if args['profile']:
+            profiler.save(Path(args['profile']))
+            profiler.print_top(args['profile_top'])
+
+        ux.print("Done!")
+        return 0
+
+    ux.print("Checking source directory...")
+    if docs_source_dir.exists():
+        ux.print(" Source directory exists")
+    else:
+        ux.print(" Source directory doesn't exist, aborting")
+        return 0
+
+    # endregion ----------------------------------------------------------------
+    # ##########################################################################
+
+    # CONVERT FILES ------------------------------------------------------------
+
+    # Incremental builds start from the manifest of the previous run, if any.
+    #  Watch mode keeps track of pages the same way, but in memory
+    build_manifest = None
+    settings: dict[str, object] = {'dedupe_assets': args['dedupe_assets']}
+    if args['asset_names'] != 'counter':
+        settings['asset_names'] = args['asset_names']
+    if image_optimizer is not None:
+        settings['optimize_images'] = [image_optimizer.image_format, image_optimizer.max_width]
+    if args['incremental']:
+        build_manifest = manifest.load(docs_target_dir, settings) \
+            or manifest.new(settings)
+    elif args['watch']:
+        build_manifest = manifest.new(settings)
+
+    # Scan the asset dir once, everything asset related is looked up in this
+    asset_index = fileman.AssetIndex(full_asset_sourcedir)
+
+    filemod.set_asset_namer(fileman.make_asset_namer(
+        asset_index, args['asset_names'], args['dedupe_assets']))
+
+    if image_optimizer is not None:
+        filemod.set_asset_namer(image_optimizer.namer(filemod.asset_namer, asset_index))
+
+    # Pages using an image whose contents changed have its old content-hash
+    #  name, and can't tell which pages those are
+    if args['asset_names'] == 'hash' and build_manifest is not None \
+            and fileman.renamed_assets(filemod.asset_namer, manifest.assets(build_manifest)):
+        ux.print('... images changed since last build, doing a full build')
+        build_manifest = manifest.new(settings)
+
+    if args['check']:
+        import check
+
+        ux.header('Checking target directory...')
+        try:
+            expected = check.expected_outputs(
+                docs_source_dir, extra_source_dir, asset_source_dir, asset_target_dir,
+                asset_index,
+                manifest.assets(build_manifest) if build_manifest is not None else None,
+                generate_nav=args['generate_nav'])
+        except imageopt.ImageEncodingError as e:
+            print(f'Error: {e}', file=sys.stderr)
+            return 1
+        differences = check.compare(docs_target_dir, expected)
+
+        # Shown even when running silently
+        for status, path in differences:
+            print(f'{status:<8} {docs_target_dir / path}')
+
+        if differences:
+            print(f'{len(differences)} files differ in {docs_target_dir}')
+            return 1
+
+        ux.print(f'{docs_target_dir} is up to date')
+        return 0
+
+    if args['archive']:
+        import check
+
+        # Same outputs as --check compares, written to the archive as they are
+        ux.header(f'Converting files into {args["archive"]}...')
+        try:
+            expected = check.expected_outputs(
+                docs_source_dir, extra_source_dir, asset_source_dir, asset_target_dir,
+                asset_index, generate_nav=args['generate_nav'])
+        except imageopt.ImageEncodingError as e:
+            print(f'Error: {e}', file=sys.stderr)
+            return 1
+        archive.write_archive(Path(args['archive']), expected)
+
+        ux.print("Done!")
+        return 0
+
+    ux.header('Converting files...')
+    if not args['incremental']:
+        manifest.remove(docs_target_dir)
+
+    # Copy and modify all *.md in one pass, extracting an assets dictionary
+    assets_dict = filemod.convert_files(
+        docs_source_dir, docs_target_dir, asset_source_dir, asset_target_dir,
+        build_manifest,
+        manifest.assets(build_manifest) if build_manifest is not None else None,
+        jobs=args['jobs'])
+
+    # GENERATE NAV YML ---------------------------------------------------------
+
+    nav_files: list[str] = []
+
+    if args['generate_nav']:
+        ux.header('Generate .nav.yml files for "awesome nav" plugin...')
+
+        nav_files = summary_nav_yml.generate_nav_ymls(docs_target_dir,
+                                                      include_star=True,
+                                                      always_use_titles=False)
+
+    # COPY AND RENAME ASSETS ---------------------------------------------------
+
+    ux.header('Copy and rename assets...')
+
+    fileman.write_assets_json(docs_source_dir, assets_dict)
+
+    ux.print(f'\nFound {len(assets_dict)} assets')
+
+    try:
+        fileman.copy_assets(assets_dict, full_asset_sourcedir, full_asset_targetdir,
+                            asset_index)
+    except imageopt.ImageEncodingError as e:
+        # The pages point at assets that aren't there, the next incremental
+        #  build has to start over
+        print(f'Error: {e}', file=sys.stderr)
+        manifest.remove(docs_target_dir)
+        return 1
+
+    # FINISHING TOUCHES --------------------------------------------------------
+
+    ux.header('Finishing touches...')
 
-# Root folders for gitbook (source) and mkdocs (target)
-docs_source_dir = Path(args['source_path'])
-docs_target_dir = Path(args['target_path'])
+    fileman.copy_extra_files(docs_target_dir, extra_source_dir)
+
+    # Instead of starting from an empty target dir, remove what's left over from
+    #  earlier builds once everything is in place
+    ux.print('\nRemoving stale files')
+    fileman.remove_stale_outputs(docs_target_dir, fileman.build_outputs(
+        filemod.page_outputs, nav_files, assets_dict, asset_target_dir, extra_source_dir))
 
-# Stylesheet source folder
-extra_source_dir = Path("extra")
+    if args['incremental']:
+        build_manifest['assets'] = dict(assets_dict)
+        manifest.save(docs_target_dir, build_manifest)
 
-# Image subfolder names
-asset_source_dir = Path(".gitbook/assets")
-asset_target_dir = Path("assets")
+    if filemod.over_budget_pages:
+        ux.print(f'\n{len(filemod.over_budget_pages)} pages went over the time budget and were passed through unchanged:')
+        for page in filemod.over_budget_pages:
+            ux.print(f' {page}')
 
-# Autogen
-full_asset_targetdir = Path(docs_target_dir, asset_target_dir)
-full_asset_sourcedir = Path(docs_source_dir, asset_source_dir)
+    print_broken_links(0)
 
+    if args['profile']:
+        profiler.save(Path(args['profile']))
+        profiler.print_top(args['profile_top'])
 
-ux.print("Checking source directory...")
-if docs_source_dir.exists():
-    ux.print(" Source directory exists")
-else:
-    ux.print(" Source directory doesn't exist, aborting")
-    exit()
+    ux.print("Done!")
 
-# endregion --------------------------------------------------------------------
-# ##############################################################################
+    # WATCH --------------------------------------------------------------------
 
+    def apply_changes(changed: set[Path]) -> None:
+        # Only redo what the changed files affect: convert changed pages, copy
+        #  assets they reference for the first time, and regenerate the nav
+        #  files if SUMMARY.md changed
+        nonlocal assets_dict
 
-# COPY FILES -------------------------------------------------------------------
+        started = time.perf_counter()
 
-ux.header('Copying files...')
-fileman.copy_files(docs_source_dir, docs_target_dir, full_asset_targetdir)
+        md_files = [path for path in changed
+                    if path.suffix == '.md' and not str(path).startswith('.')]
+        changed_assets = [path.relative_to(asset_source_dir) for path in changed
+                          if path.is_relative_to(asset_source_dir)]
 
+        if not md_files and not changed_assets:
+            return
 
-# MODIFY FILES -----------------------------------------------------------------
+        ux.header(f'Changed: {", ".join(sorted(str(path) for path in changed))}')
 
-ux.header('Modifying files...')
-# Recursive replace in all *.md, extracting an assets dictionary
-assets_dict = filemod.modify_files(
-    docs_target_dir, asset_source_dir, asset_target_dir)
+        if changed_assets:
+            asset_index.refresh()
 
+            # Changed images get new content-hash names, in every page
+            if args['asset_names'] == 'hash' and fileman.renamed_assets(
+                    filemod.asset_namer, assets_dict):
+                md_files = fileman.list_pages(docs_source_dir)
+                for entry in manifest.pages(build_manifest).values():
+                    entry['hash'] = ''
 
-# GENERATE NAV YML -------------------------------------------------------------
+        known_assets = dict(assets_dict)
+        filemod.broken_links.clear()
 
-if args['generate_nav']:
-    ux.header('Generate .nav.yml files for "awesome nav" plugin...')
+        if md_files:
+            assets_dict = filemod.convert_files(
+                docs_source_dir, docs_target_dir, asset_source_dir, asset_target_dir,
+                build_manifest, known_assets, md_files=md_files)
 
-    summary_nav_yml.generate_nav_ymls(docs_target_dir,
-                                      include_star=True,
-                                      always_use_titles=False)
+        # New references, and referenced assets whose file changed
+        changed_asset_keys = {fileman.AssetIndex.key(path.as_posix())
+                              for path in changed_assets}
+        assets_to_copy = {name: new_name for name, new_name in assets_dict.items()
+                          if name not in known_assets
+                          or fileman.AssetIndex.key(name) in changed_asset_keys}
 
-# COPY AND RENAME ASSETS -------------------------------------------------------
+        if assets_to_copy:
+            fileman.copy_assets(assets_to_copy, full_asset_sourcedir,
+                                full_asset_targetdir, asset_index)
 
-ux.header('Copy and rename assets...')
+        if assets_dict != known_assets:
+            fileman.write_assets_json(docs_source_dir, assets_dict)
 
-fileman.write_assets_json(docs_source_dir, assets_dict)
+        if args['generate_nav'] and summary_nav_yml.summary_filename in md_files:
+            summary_nav_yml.generate_nav_ymls(docs_target_dir,
+                                              include_star=True,
+                                              always_use_titles=False)
 
-ux.print(f'\nFound {len(assets_dict)} assets')
+        if args['incremental']:
+            build_manifest['assets'] = dict(assets_dict)
+            manifest.save(docs_target_dir, build_manifest)
 
-fileman.copy_assets(assets_dict, full_asset_sourcedir, full_asset_targetdir)
+        print_broken_links(0)
+        ux.print(f'... updated in {(time.perf_counter() - started) * 1000:.0f} ms')
 
+    def convert_changes(changed: set[Path]) -> None:
+        # A save can catch a page half typed (unclosed frontmatter...), report
+        #  it and keep watching, the next save tries again
+        try:
+            apply_changes(changed)
+        except Exception as e:
+            ux.print(f'... could not convert the changes: {type(e).__name__}: {e}')
 
-# FINISHING TOUCHES ------------------------------------------------------------
+    if args['watch']:
+        import watch
 
-ux.header('Finishing touches...')
+        try:
+            watch.watch(docs_source_dir, convert_changes)
+        except KeyboardInterrupt:
+            ux.print("\nStopped watching")
 
-fileman.copy_extra_files(docs_target_dir, extra_source_dir)
+    return 0
 
 
-ux.print("Done!")
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import os
+import shutil
+from pathlib import Path
+
+import manifest
+import ux
+from fileman import Asset_dict_type, AssetIndex
+
+# Optional stage that shrinks the images copied to the asset dir: images
+#  wider than max_width are scaled down, and they're re-encoded as WebP or
+#  optimized PNG/JPEG. Needs Pillow, which is only imported when images are
+#  actually named or encoded.
+#
+# Encoded images are kept in a cache dir, named by a hash of the source
+#  image and the settings, so an image is only encoded again when it
+#  changed. The asset dir gets copies of the cached files.
+
+# Images that can be re-encoded. GIFs may be animated, SVGs aren't bitmaps
+optimizable_suffixes = {'.png', '.jpg', '.jpeg', '.webp'}
+
+image_formats: list[str] = ['webp', 'png']
+
+webp_quality = 85
+jpeg_quality = 85
+
+
+class ImageEncodingError(Exception):
+    # Images the pages already point at under another format's suffix
+    pass
+
+
+def default_cache_dir() -> Path:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_home) / 'gitbook2mkdocs' / 'images'
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def is_image(source_file: Path) -> bool:
+    # Only reads the header, an image that's cut short still passes
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(source_file):
+            return True
+    except (OSError, UnidentifiedImageError):
+        return False
+
+
+def encode_image(source_file: Path, cache_file: Path, max_width: int) -> None:
+    # Encodes in the format of the cache file's suffix. Runs in a worker
+    #  process when there are several images
+    from PIL import Image
+
+    with Image.open(source_file) as image:
+        image.load()
+        resized = max_width > 0 and image.width > max_width
+
+        if resized:
+            height = max(1, round(image.height * max_width / image.width))
+            image = image.resize((max_width, height), Image.Resampling.LANCZOS)
+
+        temp_file = cache_file.with_name(cache_file.name + f'.{os.getpid()}.tmp')
+
+        if cache_file.suffix == '.webp':
+            image.save(temp_file, 'WEBP', quality=webp_quality, method=6)
+        elif cache_file.suffix == '.png':
+            image.save(temp_file, 'PNG', optimize=True)
+        else:
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(temp_file, 'JPEG', quality=jpeg_quality, optimize=True, progressive=True)
+
+    # Re-encoding in the same format doesn't always make a smaller file
+    if not resized and cache_file.suffix == source_file.suffix.lower() \
+            and temp_file.stat().st_size >= source_file.stat().st_size:
+        shutil.copyfile(source_file, temp_file)
+
+    temp_file.replace(cache_file)
+
+
+class ImageOptimizer:
+    def __init__(self, cache_dir: Path, image_format: str = 'webp', max_width: int = 1600,
+                 jobs: int = 1):
+        if image_format not in image_formats:
+            raise Exception(f"Unknown image format '{image_format}'")
+
+        self.cache_dir = cache_dir
+        self.image_format = image_format
+        self.max_width = max_width
+        self.jobs = max(1, jobs)
+        # is_image() by (path, size, mtime)
+        self.readable: dict[tuple[Path, int, int], bool] = {}
+
+    def target_name(self, asset_name: str) -> str:
+        # The name an asset gets in the asset dir
+        suffix = Path(asset_name).suffix
+        if self.image_format == 'webp' and suffix.lower() in optimizable_suffixes:
+            return asset_name[:-len(suffix)] + '.webp'
+        return asset_name
+
+    def can_encode(self, source_file: Path) -> bool:
+        stat = source_file.stat()
+        key = (source_file, stat.st_size, stat.st_mtime_ns)
+        if key not in self.readable:
+            self.readable[key] = is_image(source_file)
+        return self.readable[key]
+
+    def namer(self, namer, asset_index: AssetIndex | None = None):
+        # Wraps an asset namer (see filemod.set_asset_namer), so the images
+        #  plugin points references at the re-encoded files. With the asset
+        #  index, files that aren't images keep their suffix, as they're
+        #  copied as they are
+        def optimized_namer(local_assets: Asset_dict_type, img_filename: Path) -> str:
+            new_name: str = namer(local_assets, img_filename)
+            optimized_name = self.target_name(new_name)
+
+            source_file = asset_index.resolve(img_filename.name) \
+                if asset_index is not None and optimized_name != new_name else None
+            if source_file is not None and not self.can_encode(source_file):
+                optimized_name = new_name
+
+            if local_assets.get(img_filename.name) == new_name:
+                local_assets[img_filename.name] = optimized_name
+
+            return optimized_name
+
+        return optimized_namer
+
+    def cache_file(self, source_file: Path, target_file: Path) -> Path:
+        source_hash = manifest.file_hash(source_file.read_bytes())
+        return self.cache_dir / f'{source_hash}-{self.max_width}{target_file.suffix.lower()}'
+
+    def __call__(self, copy_targets: dict[Path, Path]) -> dict[Path, Path]:
+        # Takes the asset copies to make as {target: source}, and returns
+        #  them with re-encoded images copied from the cache instead
+        to_encode: dict[Path, Path] = {}
+        processed: dict[Path, Path] = {}
+        from_cache = 0
+
+        for target_file, source_file in copy_targets.items():
+            if source_file.suffix.lower() not in optimizable_suffixes:
+                processed[target_file] = source_file
+                continue
+
+            cache_file = self.cache_file(source_file, target_file)
+            if cache_file.is_file():
+                from_cache += 1
+            else:
+                to_encode.setdefault(cache_file, source_file)
+
+            processed[target_file] = cache_file
+
+        failed = self.encode(to_encode)
+
+        # Images that couldn't be encoded are copied as they are, unless the
+        #  pages already point at them under another format's suffix
+        wrong_format: list[str] = []
+        for target_file, cache_file in processed.items():
+            if cache_file in failed:
+                source_file = failed[cache_file]
+                if target_file.suffix.lower() != source_file.suffix.lower():
+                    wrong_format.append(f'{source_file} (as {target_file.name})')
+                processed[target_file] = source_file
+
+        if wrong_format:
+            raise ImageEncodingError(f'{len(wrong_format)} images could not be encoded as '
+                            f'{self.image_format}: {", ".join(wrong_format)}')
+
+        ux.print(f' ... {len(to_encode) - len(failed)} images encoded, {from_cache} from cache')
+        return processed
+
+    def encode(self, to_encode: dict[Path, Path]) -> dict[Path, Path]:
+        # Encodes sources into their cache files, returns the ones that
+        #  failed as {cache file: source}
+        failed: dict[Path, Path] = {}
+
+        if not to_encode:
+            return failed
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        if self.jobs == 1 or len(to_encode) == 1:
+            for cache_file, source_file in to_encode.items():
+                try:
+                    encode_image(source_file, cache_file, self.max_width)
+                except Exception as e:
+                    ux.print(f' ... could not encode {source_file}: {e}')
+                    failed[cache_file] = source_file
+            return failed
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {cache_file: executor.submit(encode_image, source_file, cache_file,
+                                                   self.max_width)
+                       for cache_file, source_file in to_encode.items()}
+
+            for cache_file, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    ux.print(f' ... could not encode {to_encode[cache_file]}: {e}')
+                    failed[cache_file] = to_encode[cache_file]
+
+        return failed
@@ -0,0 +1,108 @@
+import hashlib
+import json
+from pathlib import Path
+
+import re_apply
+import ux
+
+# Persistent record of what the previous run produced, used by incremental
+#  builds to decide which pages need to be converted again. Lives in the
+#  target dir; mkdocs ignores dotfiles so it never ends up in the site.
+#
+# {
+#   "fingerprint": "...",           # plugin set + converter source hash
+#   "settings": { ... },            # options that change the output
+#   "pages": {
+#     "chapter/page.md": {
+#       "hash": "...",              # hash of the source page
+#       "hidden": false,            # frontmatter 'hidden' state
+#       "output": "chapter/page.md" # produced file, relative to target dir
+#     }
+#   },
+#   "assets": { "image (1).png": "image-1.png" }
+# }
+
+manifest_filename = Path('.gitbook2mkdocs.json')
+
+Manifest_type = dict[str, object]
+Page_entry_type = dict[str, object]
+
+
+def file_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def fingerprint() -> str:
+    # Any change to the plugin set or to the code doing the conversion
+    #  invalidates everything converted by a previous version
+    h = hashlib.sha1()
+    sources = [Path(__file__).parent / 'filemod.py',
+               Path(re_apply.__file__).parent / '_remodule.py']
+
+    for plugin_name in re_apply.plugins_to_use:
+        h.update(plugin_name.encode('utf-8'))
+        sources.append(re_apply.plugin_file(plugin_name))
+
+    for source in sources:
+        if source.is_file():
+            h.update(source.read_bytes())
+
+    return h.hexdigest()
+
+
+def new(settings: dict[str, object] = {}) -> Manifest_type:
+    return {'fingerprint': fingerprint(), 'settings': dict(settings),
+            'pages': {}, 'assets': {}}
+
+
+def load(docs_target_dir: Path, settings: dict[str, object] = {}) -> Manifest_type | None:
+    manifest_file = docs_target_dir / manifest_filename
+
+    if not manifest_file.is_file():
+        ux.print('... no build manifest found, doing a full build')
+        return None
+
+    try:
+        manifest: Manifest_type = json.loads(
+            manifest_file.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        ux.print('... unreadable build manifest, doing a full build')
+        return None
+
+    if manifest.get('fingerprint') != fingerprint():
+        ux.print('... plugins changed since last build, doing a full build')
+        return None
+
+    if manifest.get('settings', {}) != settings:
+        ux.print('... settings changed since last build, doing a full build')
+        return None
+
+    return manifest
+
+
+def save(docs_target_dir: Path, manifest: Manifest_type) -> None:
+    manifest_file = docs_target_dir / manifest_filename
+    manifest_file.parent.mkdir(parents=True, exist_ok=True)
+
+    with manifest_file.open('w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=4, ensure_ascii=False)
+    ux.print(f'\nWriting {manifest_file}')
+
+
+def remove(docs_target_dir: Path) -> None:
+    # A build that doesn't keep the manifest up to date renames assets, so an
+    #  old manifest would point the next incremental build at wrong names
+    manifest_file = docs_target_dir / manifest_filename
+    if manifest_file.is_file():
+        manifest_file.unlink()
+        ux.print(f'... removed: {manifest_file}')
+
+
+def pages(manifest: Manifest_type) -> dict[str, Page_entry_type]:
+    page_dict: dict[str, Page_entry_type] = manifest['pages']  # type: ignore
+    return page_dict
+
+
+def assets(manifest: Manifest_type) -> dict[str, str]:
+    asset_dict: dict[str, str] = manifest['assets']  # type: ignore
+    return asset_dict
@@ -0,0 +1,225 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from pathlib import Path
+
+from mkdocs.structure.files import File, Files
+
+import fileman
+import filemod
+import summary_nav_yml
+import ux
+from converter import Converter
+
+# Converts GitBook pages while mkdocs reads them, so mkdocs can point
+#  straight at the GitBook source instead of a converted copy. Hooked into
+#  mkdocs by mkdocs_hooks.py. Needs MkDocs 1.6 or newer.
+#
+# On every build, pages are converted in mkdocs' file order, hidden pages
+#  are renamed to .hidden.md, and the renamed assets (from .gitbook/assets)
+#  and the .nav.yml files generated from SUMMARY.md are added to the site's
+#  files.
+#  Converted pages are kept in an LRU cache keyed by a hash of their source,
+#  so a rebuild by `mkdocs serve` only converts pages that changed.
+#
+# Settings go in mkdocs.yml:
+#
+#  extra:
+#    gitbook2mkdocs:
+#      cache_size: 5000
+#      asset_source_dir: .gitbook/assets
+#      asset_target_dir: assets
+#      asset_names: counter      # or hash, see fileman.HashNamer
+
+log = logging.getLogger('mkdocs.plugins.gitbook2mkdocs')
+
+# Hidden state and converted text
+Cache_entry_type = tuple[bool, str]
+
+
+class PageCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[str, Cache_entry_type] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Cache_entry_type | None:
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: Cache_entry_type) -> None:
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+# This module is imported once and kept while `mkdocs serve` reloads the
+#  config (and the hooks file) on every rebuild, so the cache and the asset
+#  names survive rebuilds. A page keeps the asset names it got first
+converter: Converter | None = None
+asset_index: fileman.AssetIndex | None = None
+page_cache = PageCache(5000)
+settings: dict[str, object] = {}
+
+# Converted text by src_uri, for the build that's running
+converted_pages: dict[str, str] = {}
+
+
+def on_config(config):
+    global converter
+    global asset_index
+    global settings
+
+    ux.set_visible(False)
+
+    new_settings: dict[str, object] = {
+        'cache_size': 5000,
+        'asset_source_dir': '.gitbook/assets',
+        'asset_target_dir': 'assets',
+        'asset_names': 'counter',
+        **((config['extra'] or {}).get('gitbook2mkdocs') or {})
+    }
+
+    # Asset names are only numbered the same way for the same settings
+    if converter is None or new_settings != settings:
+        settings = new_settings
+        converter = Converter(Path(str(settings['asset_source_dir'])),
+                              Path(str(settings['asset_target_dir'])))
+        page_cache.entries.clear()
+
+        asset_index = fileman.AssetIndex(
+            Path(config['docs_dir']) / str(settings['asset_source_dir']))
+        filemod.set_asset_namer(fileman.make_asset_namer(
+            asset_index, str(settings['asset_names'])))
+
+    page_cache.max_size = int(settings['cache_size'])  # type: ignore
+    return config
+
+
+def on_files(files: Files, config) -> Files:
+    assert converter is not None
+    assert asset_index is not None
+
+    docs_dir = Path(config['docs_dir'])
+    converted_pages.clear()
+
+    # Cached pages have the content-hash names images had when they were
+    #  converted
+    asset_index.refresh()
+    if settings['asset_names'] == 'hash' \
+            and fileman.renamed_assets(filemod.asset_namer, converter.assets):
+        page_cache.entries.clear()
+    hits, misses = page_cache.hits, page_cache.misses
+
+    sources = {file.src_uri: Path(file.abs_src_path).read_text(encoding='utf-8')
+               for file in files
+               if file.src_uri.endswith('.md') and file.abs_src_path is not None}
+
+    # Links are resolved relative to the page, and change when a page they
+    #  go to is hidden or unhidden, so the page's path and the hidden pages
+    #  are part of its cache key
+    page_index = converter.use_pages(sources)
+    hidden_pages = '\n'.join(sorted(page for page, output in page_index.items()
+                                    if page != output))
+
+    for file in list(files):
+        text = sources.get(file.src_uri)
+        if text is None:
+            continue
+
+        key = hashlib.sha1('\0'.join((file.src_uri, hidden_pages, text))
+                           .encode('utf-8')).hexdigest()
+
+        entry = page_cache.get(key)
+        if entry is None:
+            over_budget = len(filemod.over_budget_pages)
+            _, hidden, converted = converter.convert_page(file.src_uri, text)
+            entry = (hidden, converted)
+
+            # Passed through unconverted, try again on the next build
+            if len(filemod.over_budget_pages) > over_budget:
+                log.warning(f'gitbook2mkdocs: {file.src_uri} went over the time budget '
+                            'and was passed through unchanged')
+                del filemod.over_budget_pages[over_budget:]
+            else:
+                page_cache.put(key, entry)
+
+        hidden, converted = entry
+
+        if hidden:
+            # Same name as gitbook2mkdocs.py gives it, so the nav ignores it
+            hidden_file = File(fileman.hidden_name(Path(file.src_uri)).as_posix(),
+                               config['docs_dir'], config['site_dir'],
+                               config['use_directory_urls'])
+            hidden_file.abs_src_path = file.abs_src_path
+            files.remove(file)
+            files.append(hidden_file)
+            file = hidden_file
+
+        converted_pages[file.src_uri] = converted
+
+    for page, link in filemod.broken_links:
+        log.warning(f'gitbook2mkdocs: {page} links to missing page {link}')
+    filemod.broken_links.clear()
+
+    add_assets(files, config, docs_dir / Path(str(settings['asset_source_dir'])))
+    add_nav_files(files, config, docs_dir)
+
+    log.info(f'gitbook2mkdocs: {len(converted_pages)} pages, '
+             f'{page_cache.misses - misses} converted, '
+             f'{page_cache.hits - hits} from cache')
+    return files
+
+
+def add_assets(files: Files, config, full_asset_sourcedir: Path) -> None:
+    assert converter is not None
+
+    asset_index = fileman.AssetIndex(full_asset_sourcedir)
+
+    for original_name, new_name in converter.assets.items():
+        source_file = asset_index.resolve(original_name)
+        src_uri = (Path(str(settings['asset_target_dir'])) / new_name).as_posix()
+
+        if source_file is None:
+            log.warning(f'gitbook2mkdocs: missing asset {original_name} '
+                        f'(expected at {full_asset_sourcedir / fileman.AssetIndex.key(original_name)})')
+            continue
+
+        # Already added, e.g. when several names share one file
+        if files.get_file_from_path(src_uri) is not None:
+            continue
+
+        asset_file = File(src_uri, config['docs_dir'], config['site_dir'],
+                          config['use_directory_urls'])
+        asset_file.abs_src_path = str(source_file)
+        files.append(asset_file)
+
+
+def add_nav_files(files: Files, config, docs_dir: Path) -> None:
+    summary_file = docs_dir / summary_nav_yml.summary_filename
+    if not summary_file.is_file():
+        return
+
+    summary_nav_yml.set_flags(include_star=True, always_use_titles=False)
+    yml_dict = summary_nav_yml.parse_summary(
+        summary_file.read_text(encoding='utf-8'))
+
+    for nav_file, content in yml_dict.items():
+        if files.get_file_from_path(nav_file) is None:
+            files.append(File.generated(config, nav_file,
+                                        content=summary_nav_yml.nav_yml_text(content)))
+
+
+def on_page_read_source(page, config) -> str | None:
+    # None lets mkdocs read the file itself
+    return converted_pages.get(page.file.src_uri)
@@ -0,0 +1,14 @@
+import sys
+from pathlib import Path
+
+# MkDocs hooks file, see mkdocs_gitbook.py. In mkdocs.yml:
+#
+#  docs_dir: path/to/gitbook/source
+#  hooks:
+#    - path/to/gitbook2mkdocs/mkdocs_hooks.py
+
+# mkdocs loads this file by path, on every config (re)load
+if str(Path(__file__).parent) not in sys.path:
+    sys.path.insert(0, str(Path(__file__).parent))
+
+from mkdocs_gitbook import on_config, on_files, on_page_read_source  # noqa: E402
@@ -0,0 +1,148 @@
+import json
+import time
+from pathlib import Path
+
+import re_apply
+import ux
+
+# Records, per page and for the whole run, how long every plugin and each of
+#  its patterns took, how often they matched and how many bytes they changed.
+#  Fed through the callback of re_apply.apply while profiling is enabled.
+#
+# Stats are dicts of {'seconds', 'matches', 'bytes_changed'}; plugins also
+#  have a 'patterns' list with the same stats per pattern.
+
+Stats_type = dict[str, float]
+Plugin_stats_type = dict[str, object]
+
+# page: target file, seconds: time spent on the page, plugins: stats by name
+Page_profile_type = dict[str, object]
+
+enabled: bool = False
+
+run_plugins: dict[str, Plugin_stats_type] = {}
+run_pages: list[Page_profile_type] = []
+
+# The page being converted right now
+current_plugins: dict[str, Plugin_stats_type] | None = None
+current_started: float = 0.0
+
+
+def enable(profiling: bool = True) -> None:
+    global enabled
+    enabled = profiling
+
+
+def new_stats() -> Stats_type:
+    return {'seconds': 0.0, 'matches': 0, 'bytes_changed': 0}
+
+
+def add_stats(total: Stats_type, seconds: float, matches: int, bytes_changed: int) -> None:
+    total['seconds'] += seconds
+    total['matches'] += matches
+    total['bytes_changed'] += bytes_changed
+
+
+def add_plugin_stats(plugins: dict[str, Plugin_stats_type], plugin_name: str,
+                     pattern_stats: list[re_apply.Pattern_stats_type]) -> None:
+    plugin = plugins.setdefault(plugin_name, {**new_stats(), 'patterns': []})
+    patterns: list[Stats_type] = plugin['patterns']  # type: ignore
+
+    for index, (seconds, matches, bytes_changed) in enumerate(pattern_stats):
+        if index == len(patterns):
+            patterns.append(new_stats())
+        add_stats(patterns[index], seconds, matches, bytes_changed)
+        add_stats(plugin, seconds, matches, bytes_changed)  # type: ignore
+
+
+def callback() -> re_apply.Apply_callback_type | None:
+    # For re_apply.apply; None while not profiling or outside of a page
+    return record if enabled and current_plugins is not None else None
+
+
+def record(plugin_name: str, pattern_stats: list[re_apply.Pattern_stats_type]) -> None:
+    if current_plugins is not None:
+        add_plugin_stats(current_plugins, plugin_name, pattern_stats)
+
+
+def start_page() -> None:
+    global current_plugins
+    global current_started
+
+    if enabled:
+        current_plugins = {}
+        current_started = time.perf_counter()
+
+
+def end_page(target_file: Path) -> Page_profile_type | None:
+    # Returns the page's profile, to be handed to add_page
+    global current_plugins
+
+    if current_plugins is None:
+        return None
+
+    page_profile: Page_profile_type = {
+        'page': str(target_file),
+        'seconds': time.perf_counter() - current_started,
+        'plugins': current_plugins
+    }
+    current_plugins = None
+    return page_profile
+
+
+def add_page(page_profile: Page_profile_type | None) -> None:
+    # Pages profiled in worker processes are added in the main process
+    if page_profile is None:
+        return
+
+    run_pages.append(page_profile)
+
+    plugins: dict[str, Plugin_stats_type] = page_profile['plugins']  # type: ignore
+    for plugin_name, plugin in plugins.items():
+        patterns: list[Stats_type] = plugin['patterns']  # type: ignore
+        add_plugin_stats(run_plugins, plugin_name,
+                         [(stats['seconds'], int(stats['matches']), int(stats['bytes_changed']))
+                          for stats in patterns])
+
+
+def report() -> dict[str, object]:
+    return {
+        'pages': len(run_pages),
+        'seconds': sum(float(page['seconds']) for page in run_pages),  # type: ignore
+        'plugins': run_plugins,
+        'page_profiles': sorted(run_pages, key=lambda page: -float(page['seconds']))  # type: ignore
+    }
+
+
+def save(report_file: Path) -> None:
+    with report_file.open('w', encoding='utf-8') as file:
+        json.dump(report(), file, indent=4, ensure_ascii=False)
+    ux.print(f'\nWriting profile to {report_file}')
+
+
+def print_top(top: int = 10) -> None:
+    ux.print(f'\nSlowest plugins ({len(run_pages)} pages):')
+    ux.print(f' {"plugin":<22}{"ms":>10}{"matches":>10}{"bytes":>12}')
+
+    slowest = sorted(run_plugins.items(),
+                     key=lambda item: -float(item[1]['seconds']))  # type: ignore
+    for plugin_name, plugin in slowest[:top]:
+        ux.print(f' {plugin_name:<22}{stats_columns(plugin)}')  # type: ignore
+
+        patterns: list[Stats_type] = plugin['patterns']  # type: ignore
+        if len(patterns) > 1:
+            for index, stats in enumerate(patterns):
+                ux.print(f'   {f"pattern {index}":<20}{stats_columns(stats)}')
+
+    ux.print('\nSlowest pages:')
+    ux.print(f' {"ms":>8}  {"slowest plugin":<16}page')
+
+    for page in sorted(run_pages, key=lambda page: -float(page['seconds']))[:top]:  # type: ignore
+        plugins: dict[str, Stats_type] = page['plugins']  # type: ignore
+        slowest_plugin = max(plugins, key=lambda name: plugins[name]['seconds'],
+                             default='-')
+        ux.print(f' {float(page["seconds"]) * 1000:>8.1f}  {slowest_plugin:<16}{page["page"]}')  # type: ignore
+
+
+def stats_columns(stats: Stats_type) -> str:
+    return f'{stats["seconds"] * 1000:>10.1f}{int(stats["matches"]):>10}{int(stats["bytes_changed"]):>12}'
@@ -1,61 +1,120 @@
 import importlib
 import types
 import typing
+from pathlib import Path
 from ._remodule import *
 
 # https://dev.to/charlesw001/plugin-architecture-in-python-jla
 
-# Initialize; load all plugins
-
-plugins_to_use: list[str] = ['tag',
-                             'hint',
-                             'tab',
-                             'embed_yt',
-                             'embed',
-                             'code',
-                             'mark',
-                             'link',
-                             'quote',
-                             'images',
-                             'file',
-                             'listitem',
-                             ]
+# Plugin registry; plugins are applied in this order. Each plugin's module
+#  (re_apply/plugins/<name>.py) is only imported once the plugin is needed
+
+Plugin_info_type = dict[str, str]
+
+plugin_registry: dict[str, Plugin_info_type] = {
+    'tag': {'description': 'Escape HTML tags GitBook wrote as \\<tag>'},
+    'hint': {'description': '{% hint %} blocks to admonitions'},
+    'tab': {'description': '{% tab %} blocks to headings'},
+    'embed_yt': {'description': 'YouTube {% embed %} to an iframe'},
+    'embed': {'description': 'Other {% embed %} to a link'},
+    'code': {'description': '{% code %} titles and line numbers to fenced code options'},
+    'mark': {'description': 'Remove <mark> around inline code'},
+    'link': {'description': 'Folder links to README.md, fix anchors'},
+    'quote': {'description': 'Keep indents inside quotes'},
+    'images': {'description': 'Images and figures to markdown, collect assets'},
+    'file': {'description': '{% file %} embeds to admonitions, collect assets'},
+    'listitem': {'description': 'List indents from 2 to 4 spaces'},
+}
+
+plugins_to_use: list[str] = list(plugin_registry)
 
 loaded_plugins: dict[str, _remodule.ReModule] = {}
 
-for plugin_name in plugins_to_use:
-    plugin_path_name = f'{__name__}.plugins.{plugin_name}'
-    module: types.ModuleType = importlib.import_module(plugin_path_name, '.')
+# 'regex' runs every plugin over the whole text. 'scan' first checks each
+#  plugin's gate against the text and skips plugins that can't change it
+engines: list[str] = ['regex', 'scan']
+engine: str = 'regex'
+
+
+def plugin_file(plugin_name: str) -> Path:
+    return Path(__file__).parent / 'plugins' / f'{plugin_name}.py'
+
+
+def get_plugin(plugin_name: str) -> _remodule.ReModule:
+    # Imports and instantiates the plugin the first time it's asked for
+    if plugin_name not in loaded_plugins:
+        plugin_path_name = f'{__name__}.plugins.{plugin_name}'
+        module: types.ModuleType = importlib.import_module(plugin_path_name, '.')
+
+        if not issubclass(module.Plugin, _remodule.ReModule):
+            raise Exception(f"Plugin '{plugin_name}' is not a ReModule")
 
-    if issubclass(module.Plugin, _remodule.ReModule):
         m: type[_remodule.ReModule] = module.Plugin
         loaded_plugins[plugin_name] = m()
 
+    return loaded_plugins[plugin_name]
+
+
+def active_plugins() -> dict[str, _remodule.ReModule]:
+    # All plugins in use, in order, importing the ones that aren't yet
+    return {plugin_name: get_plugin(plugin_name) for plugin_name in plugins_to_use}
+
+
+def set_plugins(use: list[str] | None = None, skip: list[str] = []):
+    # Use only the plugins in use (all when None), minus the ones in skip.
+    #  The order is always the registry's
+    global plugins_to_use
 
-def apply(text: str, inc: list[str] = [], exc: list[str] = [], callback: typing.Callable[[str], None] | None = None):
-    for plugin_name in loaded_plugins:
+    for plugin_name in (use or []) + skip:
+        if plugin_name not in plugin_registry:
+            raise Exception(f"Unknown plugin '{plugin_name}'")
+
+    plugins_to_use = [plugin_name for plugin_name in plugin_registry
+                      if (use is None or plugin_name in use)
+                      and plugin_name not in skip]
+
+
+# Called after each plugin that ran, with its name and stats per pattern
+Apply_callback_type = typing.Callable[[str, list[Pattern_stats_type]], None]
+
+
+def apply(text: str, inc: list[str] = [], exc: list[str] = [], callback: Apply_callback_type | None = None,
+          protected: ProtectedSpans | None = None):
+    for plugin_name in plugins_to_use:
         if (len(inc) > 0 and plugin_name not in inc) \
                 or (len(exc) > 0 and plugin_name in exc):
             continue
-        plugin = loaded_plugins[plugin_name]
+        plugin = get_plugin(plugin_name)
 
-        text = plugin.apply(text)
+        if engine == 'scan' and not plugin.can_change(text):
+            continue
 
         if callback:
-            callback(plugin_name)
+            pattern_stats: list[Pattern_stats_type] = []
+            text = plugin.apply(text, protected, pattern_stats)
+            callback(plugin_name, pattern_stats)
+        else:
+            text = plugin.apply(text, protected)
 
     return text
 
 
+def set_engine(engine_name: str):
+    global engine
+    if engine_name not in engines:
+        raise Exception(f"Unknown engine '{engine_name}'")
+    engine = engine_name
+
+
 def set_global(key: str, value: object):
-    for plugin in loaded_plugins:
-        plugin = loaded_plugins[plugin_name]
+    for plugin_name in plugins_to_use:
+        plugin = get_plugin(plugin_name)
         plugin.local_dict[key] = value
 
 
 def set_local(plugin_name: str, key: str, value: object):
-    if plugin_name in loaded_plugins:
-        plugin = loaded_plugins[plugin_name]
+    if plugin_name in plugins_to_use:
+        plugin = get_plugin(plugin_name)
         plugin.local_dict[key] = value
 
 
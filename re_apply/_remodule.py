@@ -1,4 +1,183 @@
 import re
+import time
+import typing
+
+# Seconds, matches and bytes changed by one pattern
+Pattern_stats_type = tuple[float, int, int]
+
+
+# What ProtectedSpans.sentinel makes, with the region's number
+sentinel_pattern = re.compile('```\x00(\\d+)\x00```')
+
+
+class ProtectedSpans:
+    # Regions of the text (code blocks) that plugins must leave alone, as
+    #  (start, end) offsets. Kept in step with the text while plugins change
+    #  it, so the regions never have to be swapped out and back in again.
+
+    def __init__(self, spans: list[tuple[int, int]] | None = None):
+        self.spans: list[tuple[int, int]] = spans if spans is not None else []
+
+    def __bool__(self) -> bool:
+        return len(self.spans) > 0
+
+    def sentinel(self, index: int) -> str:
+        return f'```\x00{index}\x00```'
+
+    def collapse(self, text: str, start: int, end: int, first_span: int) \
+            -> tuple[str, list[tuple[int, int, int]]]:
+        # text[start:end] with the regions from first_span on replaced by
+        #  sentinels. Also returns (view offset, region start, region end)
+        #  for every sentinel
+        parts: list[str] = []
+        sentinels: list[tuple[int, int, int]] = []
+        pos = start
+        length = 0
+
+        for index in range(first_span, len(self.spans)):
+            span_start, span_end = self.spans[index]
+            if span_start >= end:
+                break
+            parts.append(text[pos:span_start])
+            length += span_start - pos
+            sentinel = self.sentinel(len(sentinels))
+            sentinels.append((length, span_start, span_end))
+            parts.append(sentinel)
+            length += len(sentinel)
+            pos = span_end
+
+        parts.append(text[pos:end])
+        return (''.join(parts), sentinels)
+
+    def restore(self, result: str, text: str, sentinels: list[tuple[int, int, int]]) \
+            -> tuple[str, list[tuple[int, int]]] | None:
+        # Put the regions back where the handler moved their sentinels, every
+        #  copy of them if it repeated one. Returns None if the handler
+        #  dropped one
+        parts: list[str] = []
+        placed: list[tuple[int, int]] = []
+        seen: set[int] = set()
+        pos = 0
+        length = 0
+
+        for found in sentinel_pattern.finditer(result):
+            index = int(found[1])
+            if index >= len(sentinels):
+                continue
+
+            _, span_start, span_end = sentinels[index]
+            parts.append(result[pos:found.start()])
+            length += found.start() - pos
+            parts.append(text[span_start:span_end])
+            placed.append((length, length + span_end - span_start))
+            length += span_end - span_start
+            pos = found.end()
+            seen.add(index)
+
+        if len(seen) != len(sentinels):
+            return None
+
+        parts.append(result[pos:])
+        return (''.join(parts), placed)
+
+    def sub(self, pattern: re.Pattern[str], handler: typing.Callable[[re.Match[str]], str], text: str) -> str:
+        # Like pattern.sub(handler, text), but matched as if the regions were
+        #  collapsed into short sentinels, and the regions are never changed.
+        #  Matches starting inside a region are skipped. Matches reaching
+        #  into a region are tried again with the regions collapsed, and the
+        #  handler gets to see that collapsed version.
+        spans = self.spans
+        new_spans: list[tuple[int, int]] = []
+        parts: list[str] = []
+        next_span = 0
+        copied = 0
+        length = 0
+        pos = 0
+
+        while pos <= len(text):
+            match = pattern.search(text, pos)
+            if match is None:
+                break
+            start, end = match.span()
+
+            # Regions before the match only move
+            while next_span < len(spans) and spans[next_span][1] <= start:
+                span_start, span_end = spans[next_span]
+                new_spans.append((span_start - copied + length,
+                                  span_end - copied + length))
+                next_span += 1
+
+            if next_span == len(spans) or spans[next_span][0] >= max(end, start + 1):
+                result = handler(match)
+                placed: list[tuple[int, int]] = []
+                match_end = end
+
+            elif spans[next_span][0] < start:
+                # Starts inside a region
+                pos = spans[next_span][1]
+                continue
+
+            else:
+                if all(span_end <= end or span_start >= end
+                       for span_start, span_end in spans[next_span:]):
+                    # Encloses whole regions, only collapse those
+                    view, sentinels = self.collapse(text, start, end, next_span)
+                    view_match = pattern.fullmatch(view)
+                else:
+                    # Reaches into a region, try again as if collapsed
+                    view, sentinels = self.collapse(
+                        text, start, len(text), next_span)
+                    view_match = pattern.match(view)
+
+                if view_match is None:
+                    pos = start + 1
+                    continue
+
+                # Map the end of the match back to the text
+                view_end = view_match.end()
+                match_end = start + view_end
+                used: list[tuple[int, int, int]] = []
+                for index, sentinel in enumerate(sentinels):
+                    view_offset, span_start, span_end = sentinel
+                    sentinel_length = len(self.sentinel(index))
+                    if view_offset >= view_end:
+                        break
+                    if view_offset + sentinel_length > view_end:
+                        match_end = -1
+                        break
+                    used.append(sentinel)
+                    match_end += span_end - span_start - sentinel_length
+
+                restored = self.restore(handler(view_match), text, used) \
+                    if match_end != -1 else None
+
+                if restored is None:
+                    pos = start + 1
+                    continue
+
+                result, placed = restored
+                next_span += len(used)
+
+            parts.append(text[copied:start])
+            length += start - copied
+            new_spans.extend((length + placed_start, length + placed_end)
+                             for placed_start, placed_end in placed)
+            parts.append(result)
+            length += len(result)
+            copied = match_end
+
+            pos = match_end if match_end > start else match_end + 1
+
+        if not parts:
+            return text
+
+        for span_start, span_end in spans[next_span:]:
+            new_spans.append((span_start - copied + length,
+                              span_end - copied + length))
+
+        parts.append(text[copied:])
+        self.spans = new_spans
+        return ''.join(parts)
 
 
 class ReModule:
@@ -6,14 +185,45 @@ class ReModule:
     # pattern: re.Pattern[str] = re.compile('')
     pattern: list[re.Pattern[str]] = []
 
+    # Used by the 'scan' engine: something every change the plugin can make
+    #  has to contain. If it's not in the text, the patterns aren't run at all
+    gate: re.Pattern[str] | None = None
+
     def __init__(self):
         self.local_dict: dict[str, object] = {}
 
-    def apply(self, filedata: str) -> str:
+    def apply(self, filedata: str, protected: ProtectedSpans | None = None,
+              stats: list[Pattern_stats_type] | None = None) -> str:
+        # With a stats list, (seconds, matches, bytes changed) is appended
+        #  to it for every pattern
         for p in self.pattern:
-            filedata = p.sub(self.handler, filedata)
-            
+            if stats is None:
+                filedata = self.apply_pattern(p, self.handler, filedata, protected)
+                continue
+
+            counts = [0, 0]
+
+            def counting_handler(match: re.Match[str]) -> str:
+                result = self.handler(match)
+                counts[0] += 1
+                if result != match[0]:
+                    counts[1] += max(len(match[0]), len(result))
+                return result
+
+            started = time.perf_counter()
+            filedata = self.apply_pattern(p, counting_handler, filedata, protected)
+            stats.append((time.perf_counter() - started, counts[0], counts[1]))
+
         return filedata
 
+    def apply_pattern(self, p: re.Pattern[str], handler: typing.Callable[[re.Match[str]], str],
+                      filedata: str, protected: ProtectedSpans | None) -> str:
+        if protected:
+            return protected.sub(p, handler, filedata)
+        return p.sub(handler, filedata)
+
+    def can_change(self, filedata: str) -> bool:
+        return self.gate is None or self.gate.search(filedata) is not None
+
     def handler(self, match: re.Match[str]) -> str:
         return match[0]
@@ -14,6 +14,7 @@ from .._remodule import *
 
 class Plugin (ReModule):
     name = 'code'
+    gate = re.compile(r'{% code')
     pattern = [re.compile(r'{% code ?(?:title=\"(?P<title>.*?)\" )?(?:lineNumbers=\"?(?P<linenums>.*?)\" )?%}\n```(?P<language>.*?)?\n(?P<code>.*|[\s\S]+?)```\n{% endcode %}')]
         
     def handler(self, match:re.Match[str]) -> str:
@@ -9,6 +9,7 @@ from .._remodule import *
 
 class Plugin (ReModule):
     name = 'embed'
+    gate = re.compile(r'{% embed url=\"')
     pattern = [re.compile(
         r'{% embed url=\"(?P<url>.*)\" %}')]
 
@@ -9,6 +9,7 @@ from .._remodule import *
 
 class Plugin (ReModule):
     name = 'embed_yt'
+    gate = re.compile(r'{% embed url=\"https://')
     pattern = [re.compile(
         r'{% embed url=\"https://w*\.*youtu.*/(?P<video_id>.*)\" %}')]
 
@@ -16,6 +16,7 @@ from .._remodule import *
 
 class Plugin (ReModule):
     name = 'file'
+    gate = re.compile(r'{% file src=\"')
     pattern = [re.compile(
         r'{% file src=\"(?P<filename>.*)\" %}(?:\n(?P<caption>.*?)\n{% endfile %})?')]
 
@@ -13,6 +13,7 @@ from textwrap import indent
 
 class Plugin (ReModule):
     name = 'hint'
+    gate = re.compile(r'{% hint style=\"')
     pattern = [re.compile(
         r'{% hint style=\"(?P<style>.*)\" %}\n?(?P<content>.*|[\s\S]+?)\n?{% endhint %}')]
 
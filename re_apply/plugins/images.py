@@ -14,10 +14,24 @@ from .._remodule import *
 # ```
 
 
+def name_asset(local_assets: dict[str, str], img_filename: Path) -> str:
+    # An image seen before, on this page, an earlier one or in an earlier
+    #  build (assets.json, the manifest), keeps its name
+    if img_filename.name in local_assets:
+        return local_assets[img_filename.name]
+
+    img_index = len(local_assets) + 1
+    img_new_filename = f'image-{img_index}{img_filename.suffix}'
+    local_assets[img_filename.name] = img_new_filename
+
+    return img_new_filename
+
+
 class Plugin (ReModule):
     name = 'code'
 
     # Order is important here!
+    gate = re.compile(r'!\[|<img src=\"')
     pattern = [
         # Markdown images ![]()
         re.compile(r'\!\[(?P<alt>.*)\]\((?P<filename>[^<].*[^>])\)'),
@@ -50,11 +64,9 @@ class Plugin (ReModule):
             # pyright: ignore[reportUnknownVariableType]
             local_assets: dict[str, str] = self.local_dict['assets'] # type: ignore
 
-            img_index = len(local_assets) + 1
-            img_new_filename = f'image-{img_index}{img_filename.suffix}'
-
-            if img_filename.name not in local_assets:
-                local_assets[img_filename.name] = img_new_filename
+            # A namer can be swapped in to defer naming (parallel runs)
+            namer = self.local_dict.get('namer', name_asset)
+            img_new_filename: str = namer(local_assets, img_filename) # type: ignore
 
             self.local_dict['assets'] = local_assets
         else:
@@ -1,3 +1,5 @@
+import posixpath
+import urllib.parse
 from pathlib import Path
 from .._remodule import *
 
@@ -8,14 +10,20 @@ from .._remodule import *
 # ---------- with -----------
 #   [text][link_folder/README.md]
 #   [test][#heading]
+#
+# With a page index ('pages': output path by source path) and the page's
+#  own source path ('page'), links to hidden pages are pointed at their
+#  .hidden.md output, and links to pages that aren't in the index are added
+#  to the 'broken' list as (page, link)
 
 
 class Plugin (ReModule):
     name = 'link'
     
+    gate = re.compile(r'\]\(')
     pattern = [
         # No brackets <>
-        re.compile(r'\[(?P<text>.*?)\]\((?P<url>(?<!<)(?P<path>[^<].*/)?(?P<filename>[^/\n\(]*?)?(?P<anchor>#.+?(?=\)))?)\)'),
+        re.compile(r'\[(?P<text>.*?)\]\((?P<url>(?<!<)(?P<path>[^<)][^)\n]*/)?(?P<filename>[^/\n\(]*?)?(?P<anchor>#.+?(?=\)))?)\)'),
         # With brackets <>
         re.compile(r'\[(?P<text>.*?)\]\(<(?P<url>(?P<path>.*/)?(?P<filename>.*?)?(?P<anchor>#.+?(?=\>))?)>\)')        
     ]
@@ -38,17 +46,40 @@ class Plugin (ReModule):
 
             # Remove periods from anchors
             link_anchor = link_anchor.replace('.', '')
-            
-            # TODO: Detect ".hidden"
-            # if (isinstance(self.local_dict['file'], Path)):
-            #     fullpath = Path(self.local_dict['file']).parent \
-            #         / link_url
-            #     if not fullpath.exists():
-            #         print("MISSING")
-            # test = Path(link_filename)
-            # print(test.stem)
-            # # if (test.stem.endswith('.hidden')):
+
+            link_filename = self.resolve(link_path, link_filename)
 
         link_url = link_path + link_filename + link_anchor
 
         return f'[{link_text}]({link_url})'
+
+    def resolve(self, link_path: str, link_filename: str) -> str:
+        # Returns the filename the link should use
+        page_index = self.local_dict.get('pages')
+        page = self.local_dict.get('page')
+
+        if not isinstance(page_index, dict) or not isinstance(page, Path) \
+                or not link_filename.endswith('.md') or ':' in link_path:
+            return link_filename
+
+        link = urllib.parse.unquote(link_path + link_filename)
+
+        # Links starting with / are relative to the book's root
+        if link.startswith('/'):
+            target = posixpath.normpath(link.lstrip('/'))
+        else:
+            target = posixpath.normpath(posixpath.join(page.parent.as_posix(), link))
+
+        output = page_index.get(target)
+
+        if output is None:
+            broken = self.local_dict.get('broken')
+            if isinstance(broken, list):
+                broken.append((page.as_posix(), link_path + link_filename))
+            return link_filename
+
+        # Hidden pages only get '.hidden' added to their name
+        if output != target:
+            link_filename = link_filename[:-len('.md')] + '.hidden.md'
+
+        return link_filename
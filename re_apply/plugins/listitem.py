@@ -10,6 +10,7 @@ from .._remodule import *
 
 class Plugin (ReModule):
     name = 'listitem'
+    gate = re.compile(r'  (?:[\*\+\-] |\d. )')
     pattern = [re.compile(r'(?P<indent>(?:  )*)(?P<prefix>[\*\+\-] |\d. )(?P<text>.*)')]
 
     def handler(self, match: re.Match[str]) -> str:
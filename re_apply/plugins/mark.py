@@ -9,6 +9,7 @@ from .._remodule import *
 
 class Plugin (ReModule):
     name = 'mark'
+    gate = re.compile(r'<mark')
     pattern = [re.compile(r'<mark.*?>(?P<content>`.*?`)</mark>')]
 
     def handler(self, match: re.Match[str]) -> str:
@@ -9,6 +9,7 @@ from .._remodule import *
 
 class Plugin (ReModule):
     name = 'mark'
+    gate = re.compile(r'>  ')
     pattern = [re.compile(r'> (?P<indent> *)(?P<content>.+)')]
 
     def handler(self, match: re.Match[str]) -> str:
@@ -12,6 +12,7 @@ from .._remodule import *
 
 class Plugin (ReModule):
     name = 'tab'
+    gate = re.compile(r'{% tab title=\"')
     pattern = [re.compile(
         r'{% tab title=\"(?P<title>.*)\" %}(?P<content>[\s\S]*?){% endtab %}')]
 
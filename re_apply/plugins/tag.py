@@ -8,6 +8,7 @@ from .._remodule import *
 
 class Plugin (ReModule):
     name = 'tag'
+    gate = re.compile(r'\\<')
     pattern = [re.compile(r'\\<(?P<tagname>.*?)>')]
         
     def handler(self, match:re.Match[str]) -> str:
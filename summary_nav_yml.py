@@ -1,11 +1,10 @@
 #!/usr/bin/python3
 
+import functools
 import re
 import os
 from pathlib import Path
 
-import yaml
-
 import ux
 
 Yml_dict_type = dict[str, list[str | dict[str, str]]]
@@ -25,70 +24,90 @@ flag_include_star = True
 flag_always_use_titles = True
 
 
+# Tag lines are collected here and written to tag_output_file in one go
+tag_lines: list[str] = []
+
+
 def tag_print(text: str, indent: int) -> None:
-    global flag_tag_write
-    global tag_output_file
+    if flag_tag_write:
+        tag_lines.append(indent * " " + f"<{text}>")
 
-    line = indent * " " + f"<{text}>"
 
+def write_tags() -> None:
     if flag_tag_write and tag_output_file:
-        if indent == 0 and not text.startswith("/"):
-            tag_output_file.unlink()
-        with tag_output_file.open("a", encoding="utf-8") as file:
-            file.write(line + "\n")
+        with tag_output_file.open("w", encoding="utf-8") as file:
+            file.write("".join(line + "\n" for line in tag_lines))
+    tag_lines.clear()
 
 
-def parse(yml_dict: Yml_dict_type,
-          lines: list[str],
-          current_line: int,
-          current_indent: int) -> tuple[Yml_dict_type, int, int]:
+class NavLevel:
+    # One level of the nav being parsed: the root, a chapter or a
+    #  (sub)section, started at the line holding its title. For chapters,
+    #  chapter_name is what the level above lists them as
+
+    def __init__(self, yml_dict: Yml_dict_type, lines: list[str], title_line: int,
+                 current_indent: int, chapter_name: str | None = None):
 
-    # --------------------------------------------------------------------------
-    # Title
+        # Preliminary current title
+        current_title = name_trim_pattern.sub("", lines[title_line].strip())
 
-    # Preliminary current title
-    current_title = name_trim_pattern.sub("", lines[current_line].strip())
+        # Check if chapter
+        self.is_chapter = lines[title_line].strip().startswith("## ")
 
-    # Check if chapter
-    is_chapter = lines[current_line].strip().startswith("## ")
+        # If title has a path, use that instead
+        title_data = name_sub_pattern.match(current_title)
 
-    # If title has a path, use that instead
-    title_data = name_sub_pattern.match(current_title)
+        title_filename = Path(title_data.group('filename')) \
+            if title_data else None
 
-    title_filename = Path(title_data.group('filename')) \
-        if title_data and 'filename' in title_data.groupdict() \
-        else None
+        if title_data and title_filename:
+            current_title = (title_filename.parent /
+                             nav_filename).as_posix()
 
-    if title_data and title_filename:
-        current_title = (title_filename.parent /
-                         nav_filename).as_posix()
+        # If base title ("Table of contents"), just use ".nav.yml"
+        if current_indent == 0:
+            current_title = nav_filename.as_posix()
 
-    # If base title ("Table of contents"), just use ".nav.yml"
-    if current_indent == 0:
-        current_title = nav_filename
+        self.title = current_title
+        self.indent = current_indent
+        self.chapter_name = chapter_name
+        self.paths: list[Path] = []
 
-    # --------------------------------------------------------------------------
-    # Prep
+        yml_dict[current_title] = []
 
-    if (isinstance(current_title, Path)):
-        current_title = current_title.as_posix()
+        # Add a README.md entry at start of every sub-category
+        if title_filename:
+            if title_filename.name == "README.md":
+                yml_dict[current_title].append("README.md")
 
-    yml_dict[current_title] = []
-    paths: list[Path] = []
+        tag_print(current_title, current_indent)
 
-    # Add a README.md entry at start of every sub-category
-    if title_filename:
-        if title_filename.name == "README.md":
-            yml_dict[current_title].append("README.md")
 
-    tag_print(current_title, current_indent)
+def parse(yml_dict: Yml_dict_type,
+          lines: list[str],
+          current_line: int,
+          current_indent: int) -> tuple[Yml_dict_type, int, int]:
 
+    # Levels are kept on a stack instead of recursing, so neither the depth
+    #  nor the length of SUMMARY.md is limited by the recursion limit
+    stack: list[NavLevel] = [NavLevel(yml_dict, lines, current_line, current_indent)]
     current_line += 1
 
-    # --------------------------------------------------------------------------
-    # Loop through lines
+    while True:
+        level = stack[-1]
+
+        if current_line >= len(lines):
+            # ------------------------------------------------------------------
+            # Final cleanup after last line
+
+            tag_print("/" + level.title, level.indent)
+
+            if len(stack) == 1:
+                return (yml_dict, current_line, level.indent - 1)
+
+            current_line = end_level(yml_dict, stack, current_line)
+            continue
 
-    while current_line < len(lines):
         # Remove trailing \n
         line = lines[current_line].rstrip()
 
@@ -102,59 +121,54 @@ def parse(yml_dict: Yml_dict_type,
         line_indent = int(1 + (len(line) - len(line.strip())) / 2)
 
         # ----------------------------------------------------------------------
-        # Handle recursion level & sectioning
+        # Handle levels & sectioning
 
         # If line starts a new chapter (## or ***) and we're at above level 0
-        #  then end the current run
-        if (line.startswith("## ") or line.startswith("***")) and current_indent > 0:
-            tag_print("/" + current_title, current_indent)
+        #  then end the current level
+        if (line.startswith("## ") or line.startswith("***")) and level.indent > 0:
+            tag_print("/" + level.title, level.indent)
 
-            # We're going to end the current run.
+            # We're going to end the current level.
             #  If we're in a chapter, fix its title by checking common
             #  path of subnodes
-            if is_chapter:
-                common_base_path = os.path.commonpath(paths)
+            if level.is_chapter:
+                common_base_path = os.path.commonpath(level.paths)
                 new_key = Path(common_base_path, nav_filename).as_posix()
-                yml_dict[new_key] = yml_dict.pop(current_title)
+                yml_dict[new_key] = yml_dict.pop(level.title)
 
             # Then return to previous level, but make it repeat this line
-            return (yml_dict, current_line-1, current_indent-1)
+            current_line = end_level(yml_dict, stack, current_line - 1)
+            continue
 
         # If line starts a new chapter ("##") and we're at level 0
-        #  then recurse into a new run
-        #  and then add this chapter's directory to main node's list
-        elif line.startswith("## ") and current_indent == 0:
-
-            (yml_dict, current_line, current_indent) = parse(
-                yml_dict, lines, current_line, current_indent + 1)
-
-            # When the run's ended, the last key added should match
-            #  this chapter, so combine the chapter's title with its path
-            #  e.g. Chapter Title : chapter-title
-            last_added_key = Path(list(yml_dict)[-1])
-            line_to_add = {
-                line_trimmed: last_added_key.parent.as_posix()}
-
-            yml_dict[current_title].append(line_to_add)
+        #  then start a new level for it. Once that ends, this chapter's
+        #  directory is added to main node's list
+        elif line.startswith("## ") and level.indent == 0:
+            stack.append(NavLevel(yml_dict, lines, current_line,
+                                  level.indent + 1, chapter_name=line_trimmed))
+            current_line += 1
+            continue
 
-        # ------------------------------------------------------------------------------
+        # ----------------------------------------------------------------------
         # Handle common lines
 
         if line.lstrip().startswith("* "):
 
-            # If the line is more indented than the current run's level
-            #  recurse into a new run, including the previous line as the first
+            # If the line is more indented than the current level
+            #  start a new level, with the previous line as its title
 
-            if line_indent > current_indent and current_indent > 0:
-                (yml_dict, current_line, current_indent) = parse(
-                    yml_dict, lines, current_line-1, current_indent + 1)
+            if line_indent > level.indent and level.indent > 0:
+                stack.append(NavLevel(yml_dict, lines, current_line - 1,
+                                      level.indent + 1))
+                continue
 
-            # If the line is less indented than the current run's level
+            # If the line is less indented than the current level
             #  return back to previous level
 
-            elif line_indent < current_indent and current_indent > 0:
-                tag_print("/" + current_title, current_indent)
-                return (yml_dict, current_line - 1, current_indent - 1)
+            elif line_indent < level.indent and level.indent > 0:
+                tag_print("/" + level.title, level.indent)
+                current_line = end_level(yml_dict, stack, current_line - 1)
+                continue
 
             # Otherwise it should just be a normal line, with a filename
             #  and a path that we can extract using regex
@@ -178,7 +192,7 @@ def parse(yml_dict: Yml_dict_type,
 
                     # For subsections, don't add the readme, add the last
                     #  section of the path instead, with the title
-                    if entry_filename.name == 'README.md' and entry_filename.parents and current_indent > 0:
+                    if entry_filename.name == 'README.md' and entry_filename.parents and level.indent > 0:
                         line_to_add = {
                             entry_title: entry_filename.parent.name}
 
@@ -188,26 +202,37 @@ def parse(yml_dict: Yml_dict_type,
                     else:
                         line_to_add = entry_filename.name
 
-                    tag_print(str(line_to_add) + "/", current_indent + 1)
+                    tag_print(str(line_to_add) + "/", level.indent + 1)
 
-                    if is_chapter:
-                        paths.append(entry_filename.parent)
+                    if level.is_chapter:
+                        level.paths.append(entry_filename.parent)
 
-                    yml_dict[current_title].append(line_to_add)
+                    yml_dict[level.title].append(line_to_add)
 
                 # If it can't, something is seriously wrong but just add
                 #  the trimmed line
                 else:
                     # Should never happen
-                    yml_dict[current_title].append(line_trimmed)
+                    yml_dict[level.title].append(line_trimmed)
 
         current_line += 1
 
-    # ------------------------------------------------------------------------------
-    # Final cleanup after last line
 
-    tag_print("/" + current_title, current_indent)
-    return (yml_dict, current_line, current_indent-1)
+def end_level(yml_dict: Yml_dict_type, stack: list[NavLevel], current_line: int) -> int:
+    # Drops the current level and returns the line the level above carries
+    #  on from
+    level = stack.pop()
+
+    if level.chapter_name is not None:
+        # The last key added should match this chapter, so combine the
+        #  chapter's title with its path, e.g. Chapter Title : chapter-title
+        last_added_key = Path(next(reversed(yml_dict)))
+        line_to_add = {
+            level.chapter_name: last_added_key.parent.as_posix()}
+
+        yml_dict[stack[-1].title].append(line_to_add)
+
+    return current_line + 1
 
 
 def make_nav_yml(base_dir: Path) -> Yml_dict_type:
@@ -217,48 +242,91 @@ def make_nav_yml(base_dir: Path) -> Yml_dict_type:
         ux.print("... SUMMARY.md not found")
         return {}
 
+    return parse_summary(summary_full_filename.read_text(encoding='utf-8'))
+
+
+def parse_summary(summary_text: str) -> Yml_dict_type:
     yml_dict: Yml_dict_type = {}
 
-    lines = summary_full_filename \
-        .read_text(encoding='utf-8') \
-        .splitlines()
+    lines = summary_text.splitlines()
 
     yml_dict = parse(yml_dict, lines, 0, 0)[0]
+    write_tags()
 
     return yml_dict
 
 
-def create_files(base_dir: Path, yml_dict: Yml_dict_type) -> None:
-    for filename, content in yml_dict.items():
-        full_filename = base_dir / filename
+@functools.cache
+def yaml_dumper() -> type:
+    # yaml is only imported when nav files are generated. Use the libyaml
+    #  C dumper when available, it's a lot faster
+    import yaml
+    return getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+
+def nav_structure(content: list[str | dict[str, str]]) -> dict[str, object]:
+    yml_structure: dict[str, object] = {
+        'ignore': '*.hidden.md'
+    }
+
+    if flag_include_star:
+        content = content + ['*']
+
+    yml_structure["nav"] = content
+
+    return yml_structure
 
-        yml_structure: dict[str, object] = {
-            'ignore': '*.hidden.md'
-        }
 
-        if flag_include_star:
-            content.append('*')
+def nav_yml_text(content: list[str | dict[str, str]]) -> str:
+    import yaml
 
-        yml_structure["nav"] = content
+    return yaml.dump(nav_structure(content), Dumper=yaml_dumper()) \
+        .replace("'*'", '"*"')
 
-        yml_str = yaml.safe_dump(yml_structure) \
-            .replace("'*'", '"*"')
+
+def create_files(base_dir: Path, yml_dict: Yml_dict_type) -> int:
+    # Files that already have the right contents aren't written again, so
+    #  their mtime doesn't change and mkdocs' livereload isn't triggered.
+    #  Returns how many files were written
+    written = 0
+
+    for filename, content in yml_dict.items():
+        full_filename = base_dir / filename
+
+        yml_str = nav_yml_text(content)
+
+        try:
+            if full_filename.read_text(encoding="utf-8") == yml_str:
+                ux.print(f' Unchanged {full_filename}')
+                continue
+        except (OSError, UnicodeDecodeError):
+            pass
 
         try:
             with full_filename.open("w", encoding="utf-8") as file:
                 file.write(yml_str)
             ux.print(f' Created {full_filename}')
+            written += 1
         except:
             ux.print(f' Failed to create {full_filename}')
 
+    return written
+
 
-def generate_nav_ymls(base_dir: Path, include_star: bool = True, always_use_titles: bool = False):
+def set_flags(include_star: bool = True, always_use_titles: bool = False) -> None:
     global flag_include_star
     global flag_always_use_titles
 
     flag_include_star = include_star
     flag_always_use_titles = always_use_titles
 
+
+def generate_nav_ymls(base_dir: Path, include_star: bool = True, always_use_titles: bool = False) -> list[str]:
+    # Returns the nav files, relative to base_dir
+    set_flags(include_star, always_use_titles)
+
     yml_dict = make_nav_yml(base_dir)
-    create_files(base_dir, yml_dict)
-    ux.print(f'... {len(yml_dict)} nav yml files created')
+    written = create_files(base_dir, yml_dict)
+    ux.print(f'... {len(yml_dict)} nav yml files, {written} written')
+
+    return list(yml_dict.keys())
@@ -0,0 +1,136 @@
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import filemod  # noqa: E402
+import gitbook2mkdocs  # noqa: E402
+import re_apply  # noqa: E402
+
+# A small GitBook space with the constructs the plugins handle: hints,
+#  figures, files, embeds, escaped tags, hidden pages and shared images
+book_pages: dict[str, str] = {
+    'SUMMARY.md': '''# Table of contents
+
+* [Intro](README.md)
+* [Hidden one](hidden.md)
+
+## Chapter One
+
+* [Chapter 1](chapter-1/README.md)
+  * [Page A](chapter-1/page-a.md)
+
+## Chapter Two
+
+* [Page B](chapter-2/page-b.md)
+''',
+    'README.md': '''---
+description: intro
+---
+
+# Intro&#x20;
+
+{% hint style="warning" %}
+Careful here
+{% endhint %}
+
+![shot](.gitbook/assets/shot.jpg)
+
+<figure><img src=".gitbook/assets/image (1).png" alt="one"><figcaption><p>Cap</p></figcaption></figure>
+
+See [chapter](chapter-1/) and [hidden](hidden.md) and [B](chapter-2/page-b.md).
+''',
+    'hidden.md': '''---
+hidden: true
+---
+
+# Hidden
+
+{% embed url="https://youtu.be/abc" %}
+''',
+    'chapter-1/README.md': '''# Chapter 1
+
+![again](../.gitbook/assets/shot.jpg)
+''',
+    'chapter-1/page-a.md': '''# Page A
+
+![dup](<../.gitbook/assets/image (2).png>)
+
+{% file src="../.gitbook/assets/doc.pdf" %}
+Caption
+{% endfile %}
+
+\\<h1>Heading\\</h1>
+''',
+    'chapter-2/page-b.md': '''# B
+
+![one](<../.gitbook/assets/image (1).png>)
+
+```
+code * x
+```
+''',
+}
+
+book_assets: dict[str, bytes] = {
+    'shot.jpg': b'\xff\xd8\xff\xe0 shot',
+    'image (1).png': b'\x89PNG\r\n\x1a\n one',
+    'image (2).png': b'\x89PNG\r\n\x1a\n two',
+    'doc.pdf': b'%PDF-1.4 doc',
+}
+
+
+def write_book(source_dir: Path) -> Path:
+    for page, text in book_pages.items():
+        (source_dir / page).parent.mkdir(parents=True, exist_ok=True)
+        (source_dir / page).write_text(text, encoding='utf-8')
+
+    asset_dir = source_dir / '.gitbook' / 'assets'
+    asset_dir.mkdir(parents=True, exist_ok=True)
+    for asset, data in book_assets.items():
+        (asset_dir / asset).write_bytes(data)
+
+    return source_dir
+
+
+def read_tree(root: Path) -> dict[str, bytes]:
+    return {path.relative_to(root).as_posix(): path.read_bytes()
+            for path in sorted(root.rglob('*')) if path.is_file()}
+
+
+def missing_images(target_dir: Path) -> list[str]:
+    # Image references in the converted pages that don't go to a file
+    missing: list[str] = []
+    for page in target_dir.rglob('*.md'):
+        for link in re.findall(r'!\[[^\]]*\]\(([^)]+)\)', page.read_text(encoding='utf-8')):
+            if not (page.parent / link).is_file():
+                missing.append(f'{page.relative_to(target_dir).as_posix()}: {link}')
+    return missing
+
+
+@pytest.fixture(autouse=True)
+def default_settings():
+    # Settings are module globals, which a build leaves as it set them
+    yield
+    re_apply.set_engine('regex')
+    re_apply.set_plugins()
+    filemod.set_asset_namer(None)
+    filemod.enable_conversion_cache(False)
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch) -> Path:
+    # Builds run from tmp_path, which has no extra/ dir
+    monkeypatch.chdir(tmp_path)
+    return write_book(tmp_path / 'src')
+
+
+@pytest.fixture
+def convert():
+    # Runs the command line converter in-process
+    def run(*args: str) -> int:
+        return gitbook2mkdocs.main(['--silent', *args])
+    return run
@@ -0,0 +1,33 @@
+import tarfile
+import zipfile
+
+import pytest
+
+from conftest import read_tree
+
+
+def archive_members(archive_file) -> dict[str, bytes]:
+    if archive_file.suffix == '.zip':
+        with zipfile.ZipFile(archive_file) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+
+    with tarfile.open(archive_file) as archive:
+        return {member.name: archive.extractfile(member).read()  # type: ignore
+                for member in archive.getmembers() if member.isfile()}
+
+
+@pytest.mark.parametrize('archive_name', ['docs.tar.gz', 'docs.zip'])
+def test_archive_matches_directory_build(book, convert, archive_name):
+    extra = book.parent / 'extra' / 'stylesheets'
+    extra.mkdir(parents=True)
+    (extra / 'extra.css').write_text('h1 { color: red; }\n', encoding='utf-8')
+
+    archive_file = book.parent / archive_name
+    assert convert('src', 'unused', '--archive', archive_name) == 0
+    assert not (book.parent / 'unused').exists()
+
+    convert('src', 'docs')
+
+    members = archive_members(archive_file)
+    assert 'stylesheets/extra.css' in members
+    assert members == read_tree(book.parent / 'docs')
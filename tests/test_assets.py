@@ -0,0 +1,120 @@
+import hashlib
+import json
+from pathlib import Path
+
+from conftest import book_assets, missing_images, read_tree
+
+
+def asset_names(book) -> dict[str, str]:
+    return json.loads((book / 'assets.json').read_text(encoding='utf-8'))
+
+
+def test_counter_names(book, convert):
+    convert('src', 'docs')
+
+    assert asset_names(book) == {'shot.jpg': 'image-1.jpg', 'image (1).png': 'image-2.png',
+                                 'image (2).png': 'image-3.png', 'doc.pdf': 'doc.pdf'}
+
+
+def test_dedupe(book, convert):
+    # Same contents as 'image (1).png'
+    (book / '.gitbook' / 'assets' / 'image (2).png').write_bytes(book_assets['image (1).png'])
+
+    convert('src', 'docs', '--dedupe-assets')
+
+    names = asset_names(book)
+    assert names['image (2).png'] == names['image (1).png'] == 'image-2.png'
+    assert sorted(path for path in read_tree(book.parent / 'docs') if path.startswith('assets/')) \
+        == ['assets/doc.pdf', 'assets/image-1.jpg', 'assets/image-2.png']
+    assert missing_images(book.parent / 'docs') == []
+
+
+def test_hash_names(book, convert):
+    convert('src', 'docs', '--asset-names', 'hash')
+
+    for name, new_name in asset_names(book).items():
+        if name != 'doc.pdf':
+            digest = hashlib.sha1(book_assets[name]).hexdigest()
+            assert new_name == f'image-{digest[:12]}.{name.rsplit(".", 1)[1]}'
+    assert missing_images(book.parent / 'docs') == []
+
+
+def test_hash_names_dont_shift(book, convert):
+    convert('src', 'before', '--asset-names', 'hash')
+    before = asset_names(book)
+
+    # A new image on the first page renumbers counter names, not hash names
+    (book / '.gitbook' / 'assets' / 'new.png').write_bytes(b'\x89PNG new')
+    readme = book / 'README.md'
+    readme.write_text('![new](.gitbook/assets/new.png)\n' + readme.read_text(encoding='utf-8'),
+                      encoding='utf-8')
+    convert('src', 'after', '--asset-names', 'hash')
+
+    after = asset_names(book)
+    assert {name: after[name] for name in before} == before
+
+
+def test_naming_modes_match_parallel_and_check(book, convert):
+    for args in (['--dedupe-assets'], ['--asset-names', 'hash']):
+        convert('src', 'serial', *args)
+        convert('src', 'parallel', '-j', '2', *args)
+
+        assert read_tree(book.parent / 'parallel') == read_tree(book.parent / 'serial')
+        assert convert('src', 'serial', '--check', *args) == 0
+
+
+def change_image(book, name: str = 'image (1).png') -> None:
+    (book / '.gitbook' / 'assets' / name).write_bytes(b'\x89PNG\r\n\x1a\n changed')
+
+
+def assert_hash_names_match_contents(book, docs) -> None:
+    for name, new_name in asset_names(book).items():
+        if new_name != name:
+            data = (book / '.gitbook' / 'assets' / name).read_bytes()
+            assert new_name.startswith(f'image-{hashlib.sha1(data).hexdigest()[:12]}.')
+            assert (docs / 'assets' / new_name).read_bytes() == data
+    assert missing_images(docs) == []
+
+
+def test_hash_names_follow_changed_image_incremental(book, convert):
+    convert('src', 'docs', '--incremental', '--asset-names', 'hash')
+    change_image(book)
+    convert('src', 'docs', '--incremental', '--asset-names', 'hash')
+    convert('src', 'full', '--asset-names', 'hash')
+
+    assert_hash_names_match_contents(book, book.parent / 'docs')
+    docs = read_tree(book.parent / 'docs')
+    docs.pop('.gitbook2mkdocs.json')
+    assert docs == read_tree(book.parent / 'full')
+
+
+def test_hash_names_follow_changed_image_watch(book, convert, monkeypatch):
+    import watch
+
+    def changing_watch(root, callback):
+        change_image(book)
+        callback({Path('.gitbook/assets/image (1).png')})
+
+    monkeypatch.setattr(watch, 'watch', changing_watch)
+    convert('src', 'docs', '--watch', '--asset-names', 'hash')
+
+    assert_hash_names_match_contents(book, book.parent / 'docs')
+
+
+def test_hash_names_follow_changed_image_converter(book):
+    import fileman
+    import filemod
+    from conftest import book_pages
+    from converter import Converter
+
+    filemod.set_asset_namer(fileman.make_asset_namer(
+        fileman.AssetIndex(book / '.gitbook' / 'assets'), 'hash'))
+    converter = Converter()
+    first = converter.convert(book_pages)
+    change_image(book)
+    second = converter.convert(book_pages)
+
+    data = (book / '.gitbook' / 'assets' / 'image (1).png').read_bytes()
+    assert second.assets['image (1).png'] == f'image-{hashlib.sha1(data).hexdigest()[:12]}.png'
+    assert second.assets['image (1).png'] != first.assets['image (1).png']
+    assert second.assets['shot.jpg'] == first.assets['shot.jpg']
@@ -0,0 +1,37 @@
+import json
+import time
+
+import pytest
+
+import filemod
+
+pytestmark = pytest.mark.skipif(not filemod.can_limit_time(), reason='needs SIGALRM')
+
+make_replacements = filemod.make_replacements
+
+
+def slow_replacements(filedata, *args):
+    # Stands in for a pattern stuck backtracking on one page
+    if 'Page A' in filedata:
+        time.sleep(5)
+    return make_replacements(filedata, *args)
+
+
+def test_over_budget_page_passed_through(book, convert):
+    docs = book.parent / 'docs'
+    page = 'chapter-1/page-a.md'
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(filemod, 'make_replacements', slow_replacements)
+        convert('src', 'docs', '--incremental', '--page-time-budget', '0.2')
+
+    assert (docs / page).read_text(encoding='utf-8') \
+        == (book / page).read_text(encoding='utf-8')
+
+    # Not recorded as up to date, so the next build converts it
+    pages = json.loads((docs / '.gitbook2mkdocs.json').read_text(encoding='utf-8'))['pages']
+    assert pages[page]['hash'] == ''
+    assert pages['README.md']['hash'] != ''
+
+    convert('src', 'docs', '--incremental')
+    assert '{% file' not in (docs / page).read_text(encoding='utf-8')
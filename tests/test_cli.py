@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.mark.parametrize('args', [
+    ['--plugins', 'hints'],
+    ['--plugins', ''],
+    ['--plugins', ','],
+    ['--skip-plugins', 'hint,nope'],
+])
+def test_bad_plugin_lists(book, convert, capsys, args):
+    with pytest.raises(SystemExit) as error:
+        convert('src', 'docs', *args)
+
+    assert error.value.code == 2
+    assert 'error: --' in capsys.readouterr().err
+    assert not (book.parent / 'docs').exists()
+
+
+def test_plugin_lists(book, convert):
+    assert convert('src', 'docs', '--plugins', 'hint, tab', '--skip-plugins', 'tab') == 0
+
+    readme = (book.parent / 'docs' / 'README.md').read_text(encoding='utf-8')
+    assert '!!! warning' in readme
+    assert '(assets/shot.jpg)' in readme
+
+
+@pytest.mark.parametrize('lines, message', [
+    (None, '--batch: cannot read books.txt: No such file or directory'),
+    ('src docs\nsrc\n', '--batch: books.txt:2: expected a source and a target directory'),
+    ('src docs\n"src docs\n', '--batch: books.txt:2: no closing quotation'),
+])
+def test_bad_batch_files(book, convert, capsys, lines, message):
+    if lines is not None:
+        (book.parent / 'books.txt').write_text(lines, encoding='utf-8')
+
+    with pytest.raises(SystemExit) as error:
+        convert('--batch', 'books.txt')
+
+    assert error.value.code == 2
+    assert f'error: {message}' in capsys.readouterr().err
+    assert not (book.parent / 'docs').exists()
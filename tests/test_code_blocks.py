@@ -0,0 +1,89 @@
+from converter import Converter
+
+# Code blocks in and around the constructs the plugins change. The output
+#  is what the uuid placeholders used before span protection made of it
+page = '''# Code
+
+```md
+{% hint style="info" %}
+<mark>m</mark> \\<tag>
+{% endhint %}
+```
+
+{% hint style="info" %}
+Inside
+```py
+a = '{% endhint %}'
+```
+{% endhint %}
+
+* item
+  ```
+  <mark>x</mark>
+  ```
+
+{% code title="a.py" lineNumbers="true" %}
+```python
+print("{% tab %}")
+```
+{% endcode %}
+
+> quote
+> ```
+> code in quote
+> ```
+'''
+
+converted = '''# Code
+
+```md
+{% hint style="info" %}
+<mark>m</mark> \\<tag>
+{% endhint %}
+```
+
+!!! info
+    Inside
+    ```py
+    a = '{% endhint %}'
+    ```
+
+* item
+```
+  <mark>x</mark>
+  ```
+
+``` python title="a.py" linenums="1"
+print("{% tab %}")
+```
+
+> quote
+>```
+> code in quote
+> ```
+'''
+
+
+def test_code_blocks_unchanged():
+    assert Converter().convert({'code.md': page}).pages['code.md'] == converted
+
+
+def test_code_block_contents_protected():
+    text = Converter().convert({'code.md': page}).pages['code.md']
+
+    assert "a = '{% endhint %}'" in text
+    assert '<mark>m</mark> \\<tag>' in text
+    assert 'print("{% tab %}")' in text
+
+
+def test_code_span_repeated_by_a_plugin():
+    # The embed plugin writes the url twice, code span and all
+    text = '{% embed url="https://example.com/a" %} and ```npm i``` then {% embed url="https://example.com/b" %}\n'
+
+    converted_text = Converter().convert({'code.md': text}).pages['code.md']
+
+    assert '\x00' not in converted_text
+    assert converted_text == (
+        '<div class="embed"><i class="fas fa-link"></i><a href="https://example.com/a" %} and'
+        '```npm i``` then {% embed url="https://example.com/b">https://example.com/a" %} and'
+        '```npm i``` then {% embed url="https://example.com/b</a>"\n')
@@ -0,0 +1,33 @@
+from conftest import book_pages
+from converter import Converter
+
+
+def test_asset_names_carry_over():
+    converter = Converter()
+    first = converter.convert(book_pages)
+
+    # A later call, e.g. a mkdocs serve rebuild, with one page changed
+    page = 'chapter-2/page-b.md'
+    second = converter.convert({
+        **book_pages,
+        page: book_pages[page] + '\n![shot](../.gitbook/assets/shot.jpg)\n'
+                                 '![new](../.gitbook/assets/new.png)\n'})
+
+    new_name = f'image-{len(first.assets) + 1}.png'
+    assert second.assets == {**first.assets, 'new.png': new_name}
+    for output, text in first.pages.items():
+        if output != page:
+            assert second.pages[output] == text
+
+    shot = first.assets['shot.jpg']
+    assert f'(../assets/{shot})' in second.pages[page]
+    assert f'(../assets/{new_name})' in second.pages[page]
+
+
+def test_repeated_convert_is_stable():
+    converter = Converter()
+    first = converter.convert(book_pages)
+    second = converter.convert(book_pages)
+
+    assert second.pages == first.pages
+    assert second.assets == first.assets
@@ -0,0 +1,18 @@
+from conftest import read_tree
+
+
+def test_crlf_pages(book, convert):
+    for page in ('hidden.md', 'README.md'):
+        text = (book / page).read_text(encoding='utf-8')
+        (book / page).write_bytes(text.replace('\n', '\r\n').encode('utf-8'))
+
+    convert('src', 'docs')
+    docs = read_tree(book.parent / 'docs')
+
+    # Recognised as hidden, and not removed as a stale file
+    assert 'hidden.md' not in docs
+    assert 'hidden.hidden.md' in docs
+
+    readme = docs['README.md'].decode('utf-8')
+    assert '\r' not in readme
+    assert '!!! warning\n' in readme
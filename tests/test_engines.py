@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+import re_apply
+from bench import corpus, fuzz
+from conftest import read_tree
+from converter import Converter
+
+
+def fragment_pages(seed: int, count: int, length: int) -> dict[str, str]:
+    # Random mixes of the markup the plugins look for, including broken
+    #  halves of it
+    rng = random.Random(seed)
+    return {f'page-{index}.md': ''.join(rng.choice(fuzz.fragments) for _ in range(length))
+            for index in range(count)}
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_scan_matches_regex_on_fragments(seed):
+    pages = fragment_pages(seed, 40, 30)
+
+    re_apply.set_engine('regex')
+    expected = Converter().convert(pages)
+    re_apply.set_engine('scan')
+    converted = Converter().convert(pages)
+
+    assert converted.pages == expected.pages
+    assert converted.assets == expected.assets
+
+
+def test_scan_matches_regex_on_corpus(tmp_path, monkeypatch, convert):
+    monkeypatch.chdir(tmp_path)
+    corpus.generate(tmp_path / 'src', pages=60, seed=3)
+
+    convert('src', 'regex', '--engine', 'regex')
+    convert('src', 'scan', '--engine', 'scan')
+
+    assert read_tree(tmp_path / 'scan') == read_tree(tmp_path / 'regex')
+
+
+def test_scan_matches_regex_on_book(book, convert):
+    convert('src', 'regex', '--engine', 'regex')
+    convert('src', 'scan', '--engine', 'scan')
+
+    assert read_tree(book.parent / 'scan') == read_tree(book.parent / 'regex')
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+import filecopy
+
+
+@pytest.fixture
+def pairs(tmp_path):
+    sources = {f'file-{n}.bin': os.urandom(1000 * n) for n in range(1, 4)}
+    for name, data in sources.items():
+        (tmp_path / 'src' / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / 'src' / name).write_bytes(data)
+
+    yield [(tmp_path / 'src' / name, tmp_path / 'out' / name) for name in sources]
+    filecopy.set_mode('copy')
+
+
+@pytest.mark.parametrize('mode', filecopy.copy_modes)
+def test_copy_modes(pairs, mode):
+    filecopy.set_mode(mode)
+
+    assert filecopy.copy_many(pairs) == len(pairs)
+    for source, target in pairs:
+        assert target.read_bytes() == source.read_bytes()
+
+    # Unchanged targets are left alone
+    assert filecopy.copy_many(pairs) == 0
+
+
+def test_without_fcntl_or_copy_file_range(pairs, monkeypatch):
+    # As on Windows
+    monkeypatch.setitem(sys.modules, 'fcntl', None)
+    if hasattr(os, 'copy_file_range'):
+        monkeypatch.delattr(os, 'copy_file_range')
+    filecopy.set_mode('reflink')
+
+    assert filecopy.copy_many(pairs) == len(pairs)
+    for source, target in pairs:
+        assert target.read_bytes() == source.read_bytes()
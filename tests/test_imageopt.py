@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip('PIL')
+
+from PIL import Image  # noqa: E402
+
+
+@pytest.fixture
+def images(book):
+    # Real images in place of the placeholder bytes, and one that isn't
+    asset_dir = book / '.gitbook' / 'assets'
+    Image.new('RGB', (40, 20), 'red').save(asset_dir / 'shot.jpg')
+    Image.new('RGBA', (40, 20), 'blue').save(asset_dir / 'image (1).png')
+    return asset_dir
+
+
+def test_webp(book, images, convert):
+    (images / 'image (2).png').unlink()
+    Image.new('RGB', (40, 20), 'green').save(images / 'image (2).png')
+
+    convert('src', 'docs', '--optimize-images', 'webp', '--image-cache', 'cache')
+
+    assets = sorted(path.name for path in (book.parent / 'docs' / 'assets').iterdir())
+    assert assets == ['doc.pdf', 'image-1.webp', 'image-2.webp', 'image-3.webp']
+    with Image.open(book.parent / 'docs' / 'assets' / 'image-1.webp') as image:
+        assert image.format == 'WEBP'
+
+
+def test_webp_not_an_image(book, images, convert):
+    # 'image (2).png' isn't an image, it keeps its name and is copied as it is
+    assert convert('src', 'docs', '--optimize-images', 'webp', '--image-cache', 'cache') == 0
+
+    docs = book.parent / 'docs'
+    assets = sorted(path.name for path in (docs / 'assets').iterdir())
+    assert assets == ['doc.pdf', 'image-1.webp', 'image-2.webp', 'image-3.png']
+    assert '(../assets/image-3.png)' in (docs / 'chapter-1' / 'page-a.md').read_text(encoding='utf-8')
+
+
+def test_webp_encoding_fails(book, images, convert, capsys):
+    # Cut short: the header reads fine, so the pages point at a .webp name
+    data = (images / 'image (1).png').read_bytes()
+    (images / 'image (1).png').write_bytes(data[:len(data) // 2])
+
+    assert convert('src', 'docs', '--incremental', '--optimize-images', 'webp',
+                   '--image-cache', 'cache') == 1
+    assert 'could not be encoded as webp' in capsys.readouterr().err
+    assert not (book.parent / 'docs' / '.gitbook2mkdocs.json').exists()
+
+
+def test_png_encoding_fails(book, images, convert):
+    # Same format, the original is copied instead
+    convert('src', 'docs', '--optimize-images', 'png', '--image-cache', 'cache')
+
+    docs = book.parent / 'docs'
+    assert (docs / 'assets' / 'image-3.png').read_bytes() \
+        == (images / 'image (2).png').read_bytes()
@@ -0,0 +1,58 @@
+from conftest import missing_images, read_tree
+
+
+def test_full_build_images_exist(book, convert):
+    convert('src', 'docs')
+
+    assert missing_images(book.parent / 'docs') == []
+
+
+def test_incremental_keeps_asset_names(book, convert):
+    convert('src', 'docs', '--incremental')
+    before = read_tree(book.parent / 'docs')
+
+    # A changed page with images named by the previous build
+    page = book / 'chapter-1' / 'README.md'
+    page.write_text(page.read_text(encoding='utf-8') + '\n![one](<../.gitbook/assets/image (1).png>)\n',
+                    encoding='utf-8')
+    convert('src', 'docs', '--incremental')
+
+    after = read_tree(book.parent / 'docs')
+    assert missing_images(book.parent / 'docs') == []
+    assert {path for path in after if path.startswith('assets/')} \
+        == {path for path in before if path.startswith('assets/')}
+
+
+def test_incremental_matches_full_build(book, convert):
+    convert('src', 'docs', '--incremental')
+
+    page = book / 'chapter-2' / 'page-b.md'
+    page.write_text(page.read_text(encoding='utf-8') + '\n![shot](../.gitbook/assets/shot.jpg)\n',
+                    encoding='utf-8')
+    convert('src', 'docs', '--incremental')
+    convert('src', 'full')
+
+    incremental = read_tree(book.parent / 'docs')
+    incremental.pop('.gitbook2mkdocs.json')
+    assert incremental == read_tree(book.parent / 'full')
+
+
+def add_hidden_page(book):
+    (book / 'other.md').write_text('---\nhidden: true\n---\n\n# Other\n', encoding='utf-8')
+
+
+def test_incremental_added_and_removed_hidden_page(book, convert):
+    # README links to a page that doesn't exist yet
+    readme = book / 'README.md'
+    readme.write_text(readme.read_text(encoding='utf-8') + '\n[other](other.md)\n',
+                      encoding='utf-8')
+    convert('src', 'docs', '--incremental')
+
+    for change in (add_hidden_page, lambda book: (book / 'other.md').unlink()):
+        change(book)
+        convert('src', 'docs', '--incremental')
+        convert('src', 'full')
+
+        incremental = read_tree(book.parent / 'docs')
+        incremental.pop('.gitbook2mkdocs.json')
+        assert incremental == read_tree(book.parent / 'full')
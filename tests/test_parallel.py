@@ -0,0 +1,39 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from conftest import read_tree
+
+repo_dir = Path(__file__).resolve().parent.parent
+
+
+def test_jobs_match_serial(book, convert):
+    convert('src', 'serial')
+    convert('src', 'parallel', '-j', '2')
+
+    assert read_tree(book.parent / 'parallel') == read_tree(book.parent / 'serial')
+
+
+def test_jobs_match_serial_with_selected_plugins(book, convert):
+    convert('src', 'serial', '--engine', 'scan', '--skip-plugins', 'hint')
+    convert('src', 'parallel', '--engine', 'scan', '--skip-plugins', 'hint', '-j', '2')
+
+    parallel = read_tree(book.parent / 'parallel')
+    assert parallel == read_tree(book.parent / 'serial')
+    assert b'{% hint' in parallel['README.md']
+
+
+def test_jobs_under_spawn(book, convert):
+    # Spawned workers import the modules afresh, so they only have the
+    #  settings the pool initializer gives them
+    convert('src', 'serial', '--skip-plugins', 'hint')
+
+    script = ('import multiprocessing, sys\n'
+              'multiprocessing.set_start_method("spawn")\n'
+              f'sys.path.insert(0, {str(repo_dir)!r})\n'
+              'import gitbook2mkdocs\n'
+              'sys.exit(gitbook2mkdocs.main(["--silent", "src", "parallel",'
+              ' "--skip-plugins", "hint", "-j", "2"]))\n')
+    subprocess.run([sys.executable, '-c', script], cwd=book.parent, check=True)
+
+    assert read_tree(book.parent / 'parallel') == read_tree(book.parent / 'serial')
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import fileman
+import manifest
+from conftest import missing_images, read_tree
+
+
+def test_remove_stale_outputs(tmp_path):
+    for path in ('page.md', 'old.md', 'assets/image-1.png', 'assets/image-2.png',
+                 'gone/deep/page.md', manifest.manifest_filename.as_posix()):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(path, encoding='utf-8')
+
+    removed = fileman.remove_stale_outputs(
+        tmp_path, {Path('page.md'), Path('assets/image-1.png')})
+
+    assert removed == 4
+    assert sorted(read_tree(tmp_path)) == ['assets/image-1.png', 'page.md']
+    assert not (tmp_path / 'gone').exists()
+
+
+def test_full_build_drops_manifest(book, convert):
+    docs = book.parent / 'docs'
+    convert('src', 'docs', '--incremental')
+
+    # A full build numbers the new image before the ones after it
+    readme = book / 'README.md'
+    (book / '.gitbook' / 'assets' / 'n.png').write_bytes(b'\x89PNG n')
+    readme.write_text('![n](.gitbook/assets/n.png)\n' + readme.read_text(encoding='utf-8'),
+                      encoding='utf-8')
+    convert('src', 'docs')
+    assert not (docs / manifest.manifest_filename).exists()
+
+    readme.write_text(readme.read_text(encoding='utf-8') + '\nEdited\n', encoding='utf-8')
+    convert('src', 'docs', '--incremental')
+    convert('src', 'full')
+
+    assert missing_images(docs) == []
+    after = read_tree(docs)
+    after.pop(manifest.manifest_filename.as_posix())
+    assert after == read_tree(book.parent / 'full')
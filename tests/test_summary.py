@@ -0,0 +1,83 @@
+import summary_nav_yml
+from conftest import book_pages
+
+# What the recursive parser this one replaced made of these
+deep_summary = '''# Table of contents
+
+* [Home](README.md)
+
+## Guide
+
+* [Level 0](guide/README.md)
+  * [Level 1](guide/l0/README.md)
+    * [Level 2](guide/l0/l1/README.md)
+      * [Level 3](guide/l0/l1/l2/README.md)
+        * [Level 4](guide/l0/l1/l2/l3/README.md)
+          * [Level 5](guide/l0/l1/l2/l3/l4/README.md)
+* [Back](back.md)
+
+## Reference
+
+* [API](reference/api.md)
+  * [Types](reference/types.md)
+'''
+
+book_nav = {
+    '.nav.yml': ['README.md', 'hidden.md', {'Chapter One': 'chapter-1'}, {'Chapter Two': '.'}],
+    'chapter-1/.nav.yml': [{'Chapter 1': 'chapter-1'}],
+    'Chapter Two': ['page-b.md'],
+}
+
+book_nav_with_titles = {
+    '.nav.yml': [{'Intro': 'README.md'}, {'Hidden one': 'hidden.md'},
+                 {'Chapter One': 'chapter-1'}, {'Chapter Two': '.'}],
+    'chapter-1/.nav.yml': [{'Chapter 1': 'chapter-1'}],
+    'Chapter Two': [{'Page B': 'chapter-2/page-b.md'}],
+}
+
+deep_nav = {
+    '.nav.yml': [{'Level 0': 'guide'}, 'back.md', {'Guide': 'guide/l0/l1/l2/l3'},
+                 {'Reference': 'reference'}],
+    'guide/.nav.yml': ['README.md', {'Level 1': 'l0'}],
+    'guide/l0/.nav.yml': ['README.md', {'Level 2': 'l1'}],
+    'guide/l0/l1/.nav.yml': ['README.md', {'Level 3': 'l2'}],
+    'guide/l0/l1/l2/.nav.yml': ['README.md', {'Level 4': 'l3'}],
+    'guide/l0/l1/l2/l3/.nav.yml': ['README.md', {'Level 5': 'l4'}],
+    'Reference': ['api.md'],
+    'reference/.nav.yml': ['types.md'],
+}
+
+deep_nav_with_titles = {
+    **deep_nav,
+    '.nav.yml': [{'Level 0': 'guide'}, {'Back': 'back.md'}, {'Guide': 'guide/l0/l1/l2/l3'},
+                 {'Reference': 'reference'}],
+    'Reference': [{'API': 'reference/api.md'}],
+    'reference/.nav.yml': [{'Types': 'reference/types.md'}],
+}
+
+
+def parse(summary_text: str, always_use_titles: bool) -> dict:
+    summary_nav_yml.set_flags(True, always_use_titles)
+    try:
+        return summary_nav_yml.parse_summary(summary_text)
+    finally:
+        summary_nav_yml.set_flags()
+
+
+def test_same_as_recursive_parser():
+    assert parse(book_pages['SUMMARY.md'], False) == book_nav
+    assert parse(book_pages['SUMMARY.md'], True) == book_nav_with_titles
+    assert parse(deep_summary, False) == deep_nav
+    assert parse(deep_summary, True) == deep_nav_with_titles
+
+
+def test_deeper_than_the_recursion_limit():
+    levels = 1500
+    summary_text = '# Table of contents\n\n## Guide\n\n' + ''.join(
+        '  ' * level + f'* [Level {level}](guide/{"d/" * level}README.md)\n'
+        for level in range(levels))
+
+    nav = parse(summary_text, False)
+
+    assert len(nav) == levels + 1
+    assert nav['guide/d/d/.nav.yml'] == ['README.md', {'Level 3': 'd'}]
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import watch
+from conftest import book_pages, missing_images, read_tree
+
+
+def fake_watch(edits: dict[str, str]):
+    # Stands in for watch.watch: makes the edits, reports them once and
+    #  returns as if stopped
+    def run(root: Path, callback: watch.Change_callback_type) -> None:
+        for page, text in edits.items():
+            (root / page).write_text(text, encoding='utf-8')
+        callback({Path(page) for page in edits})
+    return run
+
+
+def test_edit_during_watch(book, convert, monkeypatch):
+    edits = {
+        'chapter-2/page-b.md': '# B\n\n![shot](../.gitbook/assets/shot.jpg)\n'
+                               '![two](<../.gitbook/assets/image (2).png>)\n',
+        'chapter-1/README.md': '# Chapter 1\n\n![one](<../.gitbook/assets/image (1).png>)\n',
+    }
+    monkeypatch.setattr(watch, 'watch', fake_watch(edits))
+
+    convert('src', 'docs', '--watch')
+    convert('src', 'full')
+
+    assert missing_images(book.parent / 'docs') == []
+    assert read_tree(book.parent / 'docs') == read_tree(book.parent / 'full')
+
+
+def test_hidden_page_added_during_watch(book, convert, monkeypatch):
+    # README links to a page that doesn't exist yet
+    readme = book / 'README.md'
+    readme.write_text(book_pages['README.md'] + '\n[other](other.md)\n', encoding='utf-8')
+
+    edits = {'other.md': '---\nhidden: true\n---\n\n# Other\n'}
+    monkeypatch.setattr(watch, 'watch', fake_watch(edits))
+
+    convert('src', 'docs', '--watch')
+    convert('src', 'full')
+
+    assert read_tree(book.parent / 'docs') == read_tree(book.parent / 'full')
+
+
+def test_invalid_save_during_watch(book, convert, monkeypatch):
+    page = 'chapter-1/page-a.md'
+    saves = ['---\ntitle: [unclosed\n---\n\n# Page A\n',
+             book_pages[page] + '\n![one](<../.gitbook/assets/image (1).png>)\n']
+
+    def run(root: Path, callback: watch.Change_callback_type) -> None:
+        for text in saves:
+            (root / page).write_text(text, encoding='utf-8')
+            callback({Path(page)})
+    monkeypatch.setattr(watch, 'watch', run)
+
+    assert convert('src', 'docs', '--watch') == 0
+    convert('src', 'full')
+
+    assert missing_images(book.parent / 'docs') == []
+    assert read_tree(book.parent / 'docs') == read_tree(book.parent / 'full')
@@ -0,0 +1,161 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+import typing
+from pathlib import Path
+
+import ux
+
+# Watches a directory tree and reports changed files, relative to the root.
+#  Uses inotify on Linux and falls back to polling mtimes everywhere else.
+#  Changes arriving close together (editors tend to write a file in a few
+#  steps) are reported together.
+
+Change_callback_type = typing.Callable[[set[Path]], None]
+
+# Changes are collected for this long after the first one before reporting
+settle_time = 0.02
+poll_interval = 0.25
+
+# sys/inotify.h
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x800
+
+watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE \
+    | IN_DELETE | IN_DELETE_SELF | IN_ATTRIB | IN_MODIFY
+
+event_header = struct.Struct('iIII')
+
+
+def watch(root: Path, callback: Change_callback_type) -> None:
+    # Blocks until interrupted
+    try:
+        watch_inotify(root, callback)
+    except OSError as e:
+        ux.print(f' inotify not available ({e}), polling for changes')
+        watch_polling(root, callback)
+
+
+def load_libc() -> ctypes.CDLL:
+    libc_name = ctypes.util.find_library('c')
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+
+    if not hasattr(libc, 'inotify_init1'):
+        raise OSError('no inotify in libc')
+
+    libc.inotify_add_watch.argtypes = [
+        ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def watch_inotify(root: Path, callback: Change_callback_type) -> None:
+    libc = load_libc()
+
+    fd = libc.inotify_init1(IN_NONBLOCK)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    watched_dirs: dict[int, Path] = {}
+
+    def add_watches(directory: Path) -> None:
+        for dir_path, _, _ in os.walk(directory):
+            wd = libc.inotify_add_watch(
+                fd, os.fsencode(dir_path), watch_mask)
+            if wd >= 0:
+                watched_dirs[wd] = Path(dir_path)
+
+    try:
+        add_watches(root)
+        if not watched_dirs:
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+
+        ux.print(f'Watching {root} for changes (inotify), Ctrl+C to stop')
+
+        while True:
+            select.select([fd], [], [])
+
+            changed: set[Path] = set()
+            deadline = time.monotonic() + settle_time
+
+            while True:
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    data = b''
+
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, name_length = event_header.unpack_from(
+                        data, offset)
+                    offset += event_header.size
+                    name = data[offset:offset + name_length] \
+                        .rstrip(b'\0').decode('utf-8', 'surrogateescape')
+                    offset += name_length
+
+                    directory = watched_dirs.get(wd)
+                    if directory is None or not name:
+                        continue
+
+                    path = directory / name
+                    if mask & IN_ISDIR:
+                        if mask & (IN_CREATE | IN_MOVED_TO):
+                            add_watches(path)
+                            changed.update(
+                                file_path for file_path in path.glob('**/*')
+                                if file_path.is_file())
+                        continue
+
+                    changed.add(path)
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                select.select([fd], [], [], remaining)
+
+            if changed:
+                callback({path.relative_to(root) for path in changed})
+    finally:
+        os.close(fd)
+
+
+def snapshot(root: Path) -> dict[Path, tuple[int, int]]:
+    files: dict[Path, tuple[int, int]] = {}
+
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            path = Path(dir_path, file_name)
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files[path.relative_to(root)] = (stat.st_mtime_ns, stat.st_size)
+
+    return files
+
+
+def watch_polling(root: Path, callback: Change_callback_type) -> None:
+    ux.print(f'Watching {root} for changes (polling), Ctrl+C to stop')
+
+    files = snapshot(root)
+
+    while True:
+        time.sleep(poll_interval)
+
+        new_files = snapshot(root)
+        changed = {path for path in files.keys() | new_files.keys()
+                   if files.get(path) != new_files.get(path)}
+        files = new_files
+
+        if changed:
+            callback(changed)